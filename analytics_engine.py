@@ -0,0 +1,377 @@
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from datetime import datetime, timedelta
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_squared_error, r2_score
+from cache import TTLCache
+from config import Config
+from forecasting import fast_forecast
+from metrics import stage_timer
+from model_registry import ModelRegistry, data_version
+from timeseries import TimeSeriesStore
+
+# Fitted SARIMAX results per (product, series, data origin), reused across requests
+forecast_cache = TTLCache(max_entries=Config.FORECAST_CACHE_MAX_ENTRIES, ttl=Config.FORECAST_CACHE_TTL)
+# Fitted models persisted across restarts, keyed by product and data version
+model_registry = ModelRegistry(Config.MODEL_REGISTRY_DIR, keep_versions=Config.MODEL_REGISTRY_KEEP_VERSIONS)
+# Ingested daily observations per product
+observation_store = TimeSeriesStore(Config.TIMESERIES_DIR)
+
+def generate_mock_data(days=365):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    demand = np.random.randint(50, 200, size=days) + np.sin(np.arange(days) * 2 * np.pi / 30) * 20 + np.random.normal(0, 10, days)
+    supply = np.random.randint(40, 180, size=days) + np.cos(np.arange(days) * 2 * np.pi / 30) * 15 + np.random.normal(0, 8, days)
+    price = np.random.uniform(1.5, 5.0, size=days) + np.sin(np.arange(days) * 2 * np.pi / 60) * 0.5 + np.random.normal(0, 0.2, days)
+    weather = np.random.normal(20, 5, size=days) + np.sin(np.arange(days) * 2 * np.pi / 365) * 10
+    return dates, demand.astype(np.float64), supply.astype(np.float64), price.astype(np.float64), weather.astype(np.float64)
+
+def read_observations(product_name, days=None):
+    # Also says whether the data is ingested; models fitted on the mock stand-in
+    # are random every call and must not be persisted
+    days = days or Config.TIMESERIES_WINDOW_DAYS
+    dates, columns = observation_store.read(product_name, days=days)
+    if len(dates) < Config.TIMESERIES_MIN_DAYS:
+        # Not enough history ingested for this product yet
+        return generate_mock_data(days), False
+    return (pd.DatetimeIndex(dates), columns['demand'], columns['supply'], columns['price'], columns['weather']), True
+
+def load_observations(product_name, days=None):
+    return read_observations(product_name, days)[0]
+
+def fit_sarimax_cached(product_name, series, endog, exog=None, order=(1,1,1), seasonal_order=(1,1,1,12), persist=True):
+    # persist is set only for ingested data: mock fits are cached apart, so one
+    # can never stand in for the real history once it has been ingested
+    cache_key = (product_name, series, 'ingested' if persist else 'mock')
+    kind = f'sarimax_{series}'
+    cached = forecast_cache.get(cache_key)
+    if cached is None and persist:
+        # Pick up where the last persisted fit for this product left off
+        cached = model_registry.load(kind, product_name)
+
+    if cached is None:
+        with stage_timer('sarimax_fit'):
+            results = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order).fit(disp=False)
+        entry = (results, endog.index[-1], 0)
+    else:
+        results, last_date, appended = cached
+        new_rows = endog.index > last_date
+        if not new_rows.any():
+            forecast_cache.set(cache_key, cached)
+            return results
+
+        new_exog = exog[new_rows] if exog is not None else None
+        appended += int(new_rows.sum())
+        refreshed = None
+        if appended < Config.FORECAST_REFIT_AFTER:
+            try:
+                # Extend the state with the new observations, keeping the fitted parameters
+                with stage_timer('sarimax_append'):
+                    refreshed = results.append(endog[new_rows], exog=new_exog)
+            except ValueError:
+                # The new rows do not continue the cached index, so re-estimate instead
+                pass
+        if refreshed is None:
+            # Re-estimate on the current window, warm-started from the previous optimum
+            model = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order)
+            with stage_timer('sarimax_refit'):
+                refreshed = model.fit(start_params=results.params, disp=False)
+            appended = 0
+        entry = (refreshed, endog.index[-1], appended)
+
+    forecast_cache.set(cache_key, entry)
+    if persist:
+        model_registry.save(kind, product_name, pd.Timestamp(entry[1]).strftime('%Y%m%d'), entry)
+    return entry[0]
+
+def _fast_demand_supply(product_name, dates, demand, supply, backend, steps=30):
+    with stage_timer(f'{backend}_forecast'):
+        mean, lower, upper = fast_forecast(backend, np.stack((demand, supply)), steps=steps)
+    future_dates = pd.date_range(start=pd.Timestamp(dates[-1]) + timedelta(days=1), periods=steps)
+    summary = f'{backend} forecast from {len(dates)} days of history'
+    return {
+        'product': product_name,
+        'dates': future_dates.strftime('%Y-%m-%d').tolist(),
+        'predicted_demand': mean[0].tolist(),
+        'predicted_supply': mean[1].tolist(),
+        'demand_lower': lower[0].tolist(),
+        'demand_upper': upper[0].tolist(),
+        'supply_lower': lower[1].tolist(),
+        'supply_upper': upper[1].tolist(),
+        'model_summary_demand': summary,
+        'model_summary_supply': summary
+    }
+
+def predict_demand_supply(product_name, backend=None, observations=None):
+    # observations is a read_observations result, for callers that already read it
+    backend = backend or Config.FORECAST_BACKEND
+    (dates, demand, supply, price, weather), ingested = observations or read_observations(product_name)
+    if backend != 'sarimax':
+        return _fast_demand_supply(product_name, dates, demand, supply, backend)
+    index = pd.DatetimeIndex(dates)
+    exog = pd.DataFrame({'weather': weather, 'price': price}, index=index, copy=False)
+    
+    results_demand = fit_sarimax_cached(product_name, 'demand', pd.Series(demand, index=index, name='demand', copy=False),
+                                        exog=exog, persist=ingested)
+    results_supply = fit_sarimax_cached(product_name, 'supply', pd.Series(supply, index=index, name='supply', copy=False),
+                                        exog=exog, persist=ingested)
+    
+    future_dates = pd.date_range(start=index[-1] + timedelta(days=1), periods=30)
+    future_weather = np.random.normal(20, 5, size=30) + np.sin(np.arange(30) * 2 * np.pi / 365) * 10
+    future_price = np.random.uniform(1.5, 5.0, size=30) + np.sin(np.arange(30) * 2 * np.pi / 60) * 0.5
+    
+    future_exog = pd.DataFrame({'weather': future_weather, 'price': future_price}, index=future_dates)
+    
+    with stage_timer('sarimax_forecast'):
+        forecast_demand = results_demand.get_forecast(steps=30, exog=future_exog)
+        forecast_supply = results_supply.get_forecast(steps=30, exog=future_exog)
+    
+    return {
+        'product': product_name,
+        'dates': future_dates.strftime('%Y-%m-%d').tolist(),
+        'predicted_demand': forecast_demand.predicted_mean.tolist(),
+        'predicted_supply': forecast_supply.predicted_mean.tolist(),
+        'demand_lower': forecast_demand.conf_int()['lower demand'].tolist(),
+        'demand_upper': forecast_demand.conf_int()['upper demand'].tolist(),
+        'supply_lower': forecast_supply.conf_int()['lower supply'].tolist(),
+        'supply_upper': forecast_supply.conf_int()['upper supply'].tolist(),
+        'model_summary_demand': results_demand.summary().as_text(),
+        'model_summary_supply': results_supply.summary().as_text()
+    }
+
+def forecast_product(product_name, steps=30, backend=None):
+    backend = backend or Config.FORECAST_BACKEND
+    # One read feeds every fit, so the mock fallback is also one consistent draw
+    observations = read_observations(product_name)
+    (dates, demand, supply, price, weather), ingested = observations
+    result = predict_demand_supply(product_name, backend=backend, observations=observations)
+
+    if backend != 'sarimax':
+        result['price_forecast'] = fast_forecast(backend, price, steps=steps)[0][0].tolist()
+        return result
+    price_series = pd.Series(price, index=pd.DatetimeIndex(dates), copy=False)
+    results_price = fit_sarimax_cached(product_name, 'price', price_series, persist=ingested)
+    result['price_forecast'] = results_price.forecast(steps=steps).tolist()
+    return result
+
+_worker_thread_limits = None
+
+def _init_batch_worker():
+    global _worker_thread_limits
+    # One fit per process: keep BLAS/OpenMP from oversubscribing the cores
+    from threadpoolctl import threadpool_limits
+    _worker_thread_limits = threadpool_limits(limits=1)
+
+def _forecast_chunk(product_names):
+    results = []
+    for name in product_names:
+        try:
+            results.append(forecast_product(name))
+        except Exception as e:
+            results.append({'product': name, 'error': str(e)})
+    return results
+
+def forecast_batch(product_names, max_workers=None, chunksize=8):
+    product_names = list(product_names)
+    chunks = [product_names[i:i + chunksize] for i in range(0, len(product_names), chunksize)]
+    executor = ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_batch_worker)
+    try:
+        futures = [executor.submit(_forecast_chunk, chunk) for chunk in chunks]
+        # Yield each chunk as soon as it finishes rather than in submission order
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _trend(recent, early):
+    return np.where(recent > early, 'increasing', 'decreasing')
+
+def market_statistics(demand, supply, price, weather, trend_window=30, season_length=30):
+    # Descriptive statistics for many products at once: each input is
+    # (products, days), and every metric comes out as one value per product.
+    series = np.stack(np.broadcast_arrays(*(np.atleast_2d(np.asarray(a, dtype=np.float64))
+                                            for a in (demand, supply, price, weather))))
+    days = series.shape[-1]
+    mean = series.mean(axis=-1)
+    centered = series - mean[..., None]
+    std = np.sqrt(np.einsum('spt,spt->sp', centered, centered) / days)
+    recent = series[..., -trend_window:].mean(axis=-1)
+    early = series[..., :trend_window].mean(axis=-1)
+    seasonal = series[:2] @ np.sin(np.arange(days) * 2 * np.pi / season_length)
+    # Mean day-over-day relative change of demand and price
+    growth = (series[::2, :, 1:] / series[::2, :, :-1]).mean(axis=-1) - 1
+    weather_cov = np.einsum('spt,pt->sp', centered[:2], centered[3]) / days
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'average_demand': mean[0],
+            'average_supply': mean[1],
+            'average_price': mean[2],
+            'demand_trend': _trend(recent[0], early[0]),
+            'supply_trend': _trend(recent[1], early[1]),
+            'price_trend': _trend(recent[2], early[2]),
+            'demand_volatility': std[0] / mean[0],
+            'supply_volatility': std[1] / mean[1],
+            'price_volatility': std[2] / mean[2],
+            'seasonal_demand': np.where(seasonal[0] > 0, 'High', 'Low'),
+            'seasonal_supply': np.where(seasonal[1] > 0, 'High', 'Low'),
+            'demand_supply_ratio': np.where(mean[1] != 0, mean[0] / mean[1], np.inf),
+            'price_elasticity': growth[0] / growth[1],
+            'weather_demand_correlation': weather_cov[0] / (std[0] * std[3]),
+            'weather_supply_correlation': weather_cov[1] / (std[1] * std[3]),
+        }
+
+def get_market_insights_batch(product_names, include_summary=False, backend=None):
+    backend = backend or Config.FORECAST_BACKEND
+    product_names = list(product_names)
+    if not product_names:
+        return []
+    observations, ingested = zip(*(read_observations(name) for name in product_names))
+    # Products with different amounts of history share their most recent common window
+    days = min(len(obs[0]) for obs in observations)
+    demand, supply, price, weather = (np.stack([obs[i][-days:] for obs in observations]) for i in range(1, 5))
+    with stage_timer('market_statistics'):
+        stats = market_statistics(demand, supply, price, weather)
+    if backend != 'sarimax':
+        price_forecasts = fast_forecast(backend, price, steps=30)[0]
+
+    insights = []
+    for i, (name, (dates, *_)) in enumerate(zip(product_names, observations)):
+        insight = {'product': name}
+        insight.update((key, values[i].item()) for key, values in stats.items())
+        if backend != 'sarimax':
+            insight['price_forecast'] = price_forecasts[i].tolist()
+            if include_summary:
+                insight['model_summary'] = f'{backend} forecast from {days} days of history'
+        else:
+            results = fit_sarimax_cached(name, 'price', pd.Series(observations[i][3], index=pd.DatetimeIndex(dates), copy=False),
+                                         persist=ingested[i])
+            insight['price_forecast'] = results.forecast(steps=30).tolist()
+            if include_summary:
+                insight['model_summary'] = results.summary().as_text()
+        insights.append(insight)
+    return insights
+
+def get_market_insights(product_name, include_summary=False, backend=None):
+    return get_market_insights_batch([product_name], include_summary=include_summary, backend=backend)[0]
+
+def _split_cell_representatives(model, feature, values):
+    # Values with no split threshold between them follow the same path through
+    # every tree, so they predict the same price and only one needs evaluating.
+    # Trees compare float32 inputs against their thresholds.
+    thresholds = np.unique(np.concatenate([
+        tree.tree_.threshold[tree.tree_.feature == feature] for tree in model.estimators_
+    ]))
+    cells = np.searchsorted(thresholds, values.astype(np.float32), side='left')
+    _, first = np.unique(cells, return_index=True)
+    return values[first]
+
+def _forest_leaf_boxes(model):
+    # Every leaf of every tree as the box of inputs that reach it: lows < x <= highs
+    n_features = model.n_features_in_
+    lows, highs, values = [], [], []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        stack = [(0, np.full(n_features, -np.inf), np.full(n_features, np.inf))]
+        while stack:
+            node, low, high = stack.pop()
+            if tree.children_left[node] == -1:
+                lows.append(low)
+                highs.append(high)
+                values.append(tree.value[node, 0, 0])
+                continue
+            feature, threshold = tree.feature[node], tree.threshold[node]
+            left_high = high.copy()
+            left_high[feature] = min(high[feature], threshold)
+            right_low = low.copy()
+            right_low[feature] = max(low[feature], threshold)
+            stack.append((tree.children_left[node], low, left_high))
+            stack.append((tree.children_right[node], right_low, high))
+    return np.array(lows), np.array(highs), np.array(values)
+
+def _forest_grid_max(model, axes):
+    # Each leaf covers a contiguous block of grid indices, so summing the leaf
+    # values block by block (via a difference array) yields the forest's
+    # prediction on the whole grid without running a single tree traversal.
+    lows, highs, values = _forest_leaf_boxes(model)
+    axes32 = [axis.astype(np.float32).astype(np.float64) for axis in axes]
+    starts = np.column_stack([np.searchsorted(axis, lows[:, f], side='right') for f, axis in enumerate(axes32)])
+    stops = np.column_stack([np.searchsorted(axis, highs[:, f], side='right') for f, axis in enumerate(axes32)])
+    on_grid = np.all(starts < stops, axis=1)
+    starts, stops, values = starts[on_grid], stops[on_grid], values[on_grid]
+
+    shape = tuple(len(axis) + 1 for axis in axes)
+    flat_index, weights = [], []
+    for corner in itertools.product((0, 1), repeat=len(axes)):
+        index = np.where(np.array(corner)[:, None], stops.T, starts.T)
+        flat_index.append(np.ravel_multi_index(index, shape))
+        weights.append(values * (-1) ** sum(corner))
+    totals = np.bincount(np.concatenate(flat_index), np.concatenate(weights), minlength=int(np.prod(shape)))
+    totals = totals.reshape(shape)
+    for axis in range(len(axes)):
+        np.cumsum(totals, axis=axis, out=totals)
+    totals = totals[tuple(slice(0, len(axis)) for axis in axes)]
+
+    # The running sums carry rounding error, so settle near-ties with the model itself
+    candidates = np.flatnonzero(totals >= totals.max() - 1e-6)
+    index = np.unravel_index(candidates, totals.shape)
+    X_candidates = np.column_stack([axis[i] for axis, i in zip(axes, index)])
+    return model.predict(X_candidates).max()
+
+def search_optimal_price(model, demand, supply, weather, search='thresholds', grid_size=100):
+    possible_demand = np.linspace(np.min(demand), np.max(demand), grid_size)
+    possible_supply = np.linspace(np.min(supply), np.max(supply), grid_size)
+    possible_weather = np.linspace(np.min(weather), np.max(weather), grid_size)
+
+    if search == 'grid':
+        demand_grid, supply_grid, weather_grid = np.meshgrid(possible_demand, possible_supply, possible_weather)
+        X_grid = np.column_stack((demand_grid.ravel(), supply_grid.ravel(), weather_grid.ravel()))
+        return np.max(model.predict(X_grid))
+    if search == 'thresholds':
+        axes = [_split_cell_representatives(model, feature, values)
+                for feature, values in enumerate((possible_demand, possible_supply, possible_weather))]
+        return _forest_grid_max(model, axes)
+    raise ValueError(f'Unknown search mode: {search}')
+
+def get_optimal_price(product_name, search='thresholds'):
+    (dates, demand, supply, price, weather), ingested = read_observations(product_name)
+    
+    X = np.column_stack((demand, supply, weather))
+    y = price
+    
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    version = data_version(X, y) if ingested else None
+    model = model_registry.load('price_forest', product_name, version) if ingested else None
+    if model is None:
+        model = RandomForestRegressor(n_estimators=100, random_state=42)
+        with stage_timer('forest_fit'):
+            model.fit(X_train, y_train)
+        if ingested:
+            model_registry.save('price_forest', product_name, version, model)
+    
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+    
+    with stage_timer(f'price_search_{search}'):
+        optimal_price = search_optimal_price(model, demand, supply, weather, search=search)
+    
+    feature_importance = pd.DataFrame({
+        'feature': ['demand', 'supply', 'weather'],
+        'importance': model.feature_importances_
+    }).sort_values('importance', ascending=False)
+    
+    return {
+        'optimal_price': optimal_price,
+        'model_mse': mse,
+        'model_r2': r2,
+        'feature_importance': feature_importance.to_dict(orient='records')
+    }
@@ -0,0 +1,198 @@
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from flask_login import current_user, login_required
+from sqlalchemy import case, func, or_
+from models import db, Product, ForecastResult, replica_reads
+from jobs import forecast_jobs
+from recommendations import get_cached_recommendations
+from geo import CLUSTER_MAX_ZOOM, cluster_precision, parse_bbox
+from search import catalog_search, SearchIndexWarming
+
+api = Blueprint('api', __name__)
+
+PRODUCE_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 50
+RECOMMENDATIONS_SHOWN = 5
+MAX_TILE_ZOOM = 12
+# Tile URLs carry the raster version, and a rebuild changes it, so a versioned
+# tile never changes and browsers can keep it without revalidating
+TILE_MAX_AGE = 365 * 24 * 3600
+
+_climate_zones = None
+
+def climate_zones():
+    # numpy is only imported once the first climate request arrives
+    global _climate_zones
+    if _climate_zones is None:
+        from climate import ClimateZones
+        _climate_zones = ClimateZones(current_app.config['CLIMATE_RASTER_PATH'])
+    return _climate_zones
+
+def _stored_result(product_name, kind):
+    product = Product.query.filter_by(name=product_name).first_or_404()
+    result = ForecastResult.latest(product.id, kind)
+    if result is None:
+        # Nothing precomputed yet: schedule it instead of fitting in the request thread
+        job_id = forecast_jobs.enqueue(product)
+        return jsonify({
+            'status': 'pending',
+            'job_id': job_id,
+            'status_url': url_for('api.job_status', job_id=job_id),
+        }), 202
+    return jsonify(result.payload)
+
+@api.route('/predict/<product_name>')
+def predict(product_name):
+    return _stored_result(product_name, 'demand_supply')
+
+@api.route('/market_insights/<product_name>')
+def market_insights(product_name):
+    return _stored_result(product_name, 'market_insights')
+
+@api.route('/optimal_price/<product_name>')
+def optimal_price(product_name):
+    return _stored_result(product_name, 'optimal_price')
+
+@api.route('/products/<int:product_id>/recompute', methods=['POST'])
+@login_required
+def recompute(product_id):
+    product = Product.query.get_or_404(product_id)
+    job_id = forecast_jobs.enqueue(product)
+    return jsonify(forecast_jobs.status(job_id)), 202
+
+@api.route('/recommendations/<product_name>')
+@login_required
+def recommendations(product_name):
+    # The signed-in user's cached list, less the product being viewed
+    products = get_cached_recommendations(current_user, limit=RECOMMENDATIONS_SHOWN + 1)
+    return jsonify([product.name for product in products if product.name != product_name][:RECOMMENDATIONS_SHOWN])
+
+@api.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = forecast_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+@api.route('/produce_data')
+@replica_reads()
+def produce_data():
+    try:
+        south, west, north, east = parse_bbox(request.args.get('bbox', '-90,-180,90,180'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    zoom = request.args.get('zoom', CLUSTER_MAX_ZOOM, type=int)
+
+    in_view = [Product.latitude.between(south, north)]
+    if west <= east:
+        in_view.append(Product.longitude.between(west, east))
+    else:
+        # The viewport crosses the antimeridian
+        in_view.append(or_(Product.longitude >= west, Product.longitude <= east))
+
+    if zoom < CLUSTER_MAX_ZOOM:
+        # Zoomed out: one aggregate per geohash cell instead of every listing
+        cell = func.substr(Product.geohash, 1, cluster_precision(zoom))
+        rows = db.session.query(
+            cell, func.count(Product.id), func.avg(Product.latitude), func.avg(Product.longitude),
+            func.avg(Product.price), func.sum(case((Product.is_organic.is_(True), 1), else_=0))
+        ).filter(*in_view).group_by(cell).all()
+        return jsonify({
+            'mode': 'clusters',
+            'zoom': zoom,
+            'clusters': [{
+                'cell': cell_id,
+                'count': count,
+                'lat': lat,
+                'lng': lng,
+                'average_price': round(average_price, 2),
+                'organic_share': organic / count,
+            } for cell_id, count, lat, lng, average_price, organic in rows],
+        })
+
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', PRODUCE_PAGE_SIZE, type=int), PRODUCE_PAGE_SIZE))
+    rows = db.session.query(
+        Product.id, Product.name, Product.latitude, Product.longitude, Product.price, Product.is_organic
+    ).filter(*in_view, Product.id > after).order_by(Product.id).limit(limit + 1).all()
+    return jsonify({
+        'mode': 'points',
+        'zoom': zoom,
+        'points': [{
+            'id': row.id,
+            'name': row.name,
+            'lat': row.latitude,
+            'lng': row.longitude,
+            'price': row.price,
+            'organic': bool(row.is_organic),
+        } for row in rows[:limit]],
+        'next': rows[limit - 1].id if len(rows) > limit else None,
+    })
+
+@api.route('/climate_zones')
+def climate_zones_layer():
+    # Read once per page load; the map builds its tile URLs from this version
+    response = jsonify({'version': climate_zones().version, 'max_zoom': MAX_TILE_ZOOM})
+    response.cache_control.no_cache = True
+    return response
+
+@api.route('/climate_zones/<int:z>/<int:x>/<int:y>.png')
+def climate_zone_tile(z, x, y):
+    if z > MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return jsonify({'error': 'Tile out of range'}), 404
+    zones = climate_zones()
+    response = Response(mimetype='image/png')
+    response.set_etag(zones.version)
+    response.cache_control.public = True
+    if request.args.get('v') == zones.version:
+        response.cache_control.max_age = TILE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Unversioned or from before a rebuild: revalidate by ETag instead
+        response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code != 304:
+        response.set_data(zones.tile(z, x, y))
+    return response
+
+@api.route('/climate_zone')
+def climate_zone():
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'error': 'lat and lng are required'}), 400
+    response = jsonify({'lat': lat, 'lng': lng, 'zone': climate_zones().zone_at(lat, lng)})
+    response.cache_control.public = True
+    response.cache_control.max_age = 24 * 3600
+    return response
+
+@api.errorhandler(SearchIndexWarming)
+def search_index_warming(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@api.route('/search')
+def search_products():
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_SEARCH_RESULTS))
+    ranked = catalog_search.search(query, limit=limit)
+    products = {product.id: product for product in
+                Product.query.filter(Product.id.in_([product_id for product_id, _ in ranked]))}
+    return jsonify({
+        'query': query,
+        'results': [{
+            'id': product_id,
+            'name': products[product_id].name,
+            'category': products[product_id].category,
+            'price': products[product_id].price,
+            'is_organic': products[product_id].is_organic,
+            'url': url_for('product_detail', product_id=product_id),
+            'score': round(score, 4),
+        } for product_id, score in ranked if product_id in products],
+    })
+
+@api.route('/search/suggest')
+def suggest_products():
+    query = request.args.get('q', '')
+    return jsonify({'query': query, 'suggestions': catalog_search.suggest(query, limit=10)})
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+
+from flask import Blueprint, Response, jsonify, request, url_for
+from models import db, Product, ForecastResult, replica_reads
+from jobs import forecast_jobs
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api_v1 = Blueprint('api_v1', __name__)
+
+MIN_COMPRESS_BYTES = 1024
+SUMMARY_PREFIX = 'model_summary'
+
+def _requested_fields():
+    # ?fields=a,b picks keys; ?fields=* returns everything. By default (None) the
+    # model summaries, by far the largest part of a payload, are left out.
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    if fields == '*':
+        return fields
+    return frozenset(field.strip() for field in fields.split(','))
+
+def _fields_tag(fields):
+    # The ETag carries the selection only in parsed form, so any query string makes a valid tag
+    if fields is None:
+        return 'default'
+    if fields == '*':
+        return 'all'
+    return hashlib.sha1(','.join(sorted(fields)).encode()).hexdigest()[:16]
+
+def _selected_fields(payload, fields):
+    if fields == '*':
+        return payload
+    if fields:
+        return {key: value for key, value in payload.items() if key in fields}
+    return {key: value for key, value in payload.items() if not key.startswith(SUMMARY_PREFIX)}
+
+def _latest_result(product_id, kind):
+    # Check freshness from the index alone; the payload is only loaded on a miss
+    return db.session.query(ForecastResult.id, ForecastResult.computed_at) \
+        .filter_by(product_id=product_id, kind=kind) \
+        .order_by(ForecastResult.computed_at.desc()).first()
+
+def _stored_result(product_name, kind):
+    with replica_reads():
+        product = Product.query.filter_by(name=product_name).first_or_404()
+        latest = _latest_result(product.id, kind)
+    if latest is None:
+        # The replica may lag a result a job just wrote: confirm on the primary before recomputing
+        latest = _latest_result(product.id, kind)
+    if latest is None:
+        job_id = forecast_jobs.enqueue(product)
+        response = jsonify({
+            'status': 'pending',
+            'job_id': job_id,
+            'status_url': url_for('api.job_status', job_id=job_id),
+        })
+        response.status_code = 202
+        response.headers['Retry-After'] = '2'
+        return response
+
+    # Each model run stores a new row, so its id versions both model and data
+    fields = _requested_fields()
+    response = Response(mimetype='application/json')
+    response.set_etag(f'{kind}-{latest.id}-{_fields_tag(fields)}', weak=True)
+    response.last_modified = latest.computed_at
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    with replica_reads():
+        result = db.session.get(ForecastResult, latest.id)
+    payload = (result or db.session.get(ForecastResult, latest.id)).payload
+    response.set_data(json.dumps(_selected_fields(payload, fields), separators=(',', ':')))
+    return response
+
+@api_v1.after_request
+def compress(response):
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.content_length is None or response.content_length < MIN_COMPRESS_BYTES):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(response.get_data(), quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@api_v1.route('/products/<product_name>/forecast')
+def forecast(product_name):
+    return _stored_result(product_name, 'demand_supply')
+
+@api_v1.route('/products/<product_name>/insights')
+def insights(product_name):
+    return _stored_result(product_name, 'market_insights')
+
+@api_v1.route('/products/<product_name>/optimal_price')
+def optimal_price(product_name):
+    return _stored_result(product_name, 'optimal_price')
@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from urllib.parse import urlparse
 from flask_login import login_user, logout_user, current_user
+from sqlalchemy.exc import IntegrityError
 from forms import LoginForm, RegistrationForm
 from models import User, db
+from passwords import PasswordHasherBusy
+from user_cache import invalidate_user
 
 auth = Blueprint('auth', __name__)
 
@@ -13,9 +16,19 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and user.password_needs_rehash():
+                # Hashing parameters changed since this hash was made; upgrade it while we have the password
+                user.set_password(form.password.data)
+                db.session.commit()
+        except PasswordHasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment.')
+            return render_template('login.html', title='Sign In', form=form), 503
+        if not valid:
             flash('Invalid email or password')
             return redirect(url_for('auth.login'))
+        invalidate_user(user.id)
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or urlparse(next_page).netloc != '':
@@ -25,6 +38,8 @@ def login():
 
 @auth.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        invalidate_user(current_user.id)
     logout_user()
     return redirect(url_for('index'))
 
@@ -35,9 +50,19 @@ def register():
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('Too many sign-ups right now, please try again in a moment.')
+            return render_template('register.html', title='Register', form=form), 503
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Someone took the username or email between validation and the insert
+            db.session.rollback()
+            flash('Please use a different username or email address.')
+            return render_template('register.html', title='Register', form=form)
         flash('Congratulations, you are now a registered user!')
         return redirect(url_for('auth.login'))
     return render_template('register.html', title='Register', form=form)
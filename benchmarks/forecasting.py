@@ -0,0 +1,75 @@
+# Compares the vectorised forecasting backends with per-series SARIMAX on
+# synthetic demand histories, holding out the last 30 days. SARIMAX is fitted
+# on a subset only; it is orders of magnitude slower. Run from the repository
+# root:
+#
+#     python -m benchmarks.forecasting --series 2000 --sarimax-series 10
+import argparse
+import time
+import warnings
+
+import numpy as np
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from analytics import generate_mock_data
+from forecasting import FAST_BACKENDS
+
+HORIZON = 30
+
+
+def errors(actual, predicted, lower, upper):
+    return {
+        'mae': float(np.abs(actual - predicted).mean()),
+        'mape': float((np.abs(actual - predicted) / np.abs(actual)).mean() * 100),
+        'coverage': float(((actual >= lower) & (actual <= upper)).mean() * 100),
+    }
+
+
+def sarimax_forecast(series):
+    mean, lower, upper = [], [], []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for row in series:
+            forecast = SARIMAX(row, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12)).fit(disp=False).get_forecast(HORIZON)
+            interval = forecast.conf_int()
+            mean.append(forecast.predicted_mean)
+            lower.append(interval[:, 0])
+            upper.append(interval[:, 1])
+    return np.array(mean), np.array(lower), np.array(upper)
+
+
+def report(name, forecast, history, actual):
+    started = time.perf_counter()
+    mean, lower, upper = forecast(history)
+    elapsed = time.perf_counter() - started
+    scores = errors(actual, mean, lower, upper)
+    print(f'{name:16s} {len(history):6d} series {len(history) / elapsed:10.0f} series/s  '
+          f'MAE {scores["mae"]:7.2f}  MAPE {scores["mape"]:6.2f}%  95% band coverage {scores["coverage"]:5.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--series', type=int, default=2000)
+    parser.add_argument('--sarimax-series', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    demand = np.stack([generate_mock_data(args.days + HORIZON)[1] for _ in range(args.series)])
+    history, actual = demand[:, :-HORIZON], demand[:, -HORIZON:]
+
+    forecasts = {name: (lambda series, backend=backend: backend(series, steps=HORIZON))
+                 for name, backend in FAST_BACKENDS.items()}
+    for name, forecast in forecasts.items():
+        report(name, forecast, history, actual)
+
+    # Like-for-like accuracy on the series SARIMAX has time for
+    subset = args.sarimax_series
+    forecasts['sarimax'] = sarimax_forecast
+    for name, forecast in forecasts.items():
+        report(name, forecast, history[:subset], actual[:subset])
+
+
+if __name__ == '__main__':
+    main()
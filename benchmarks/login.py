@@ -0,0 +1,104 @@
+# Load test for the login path: seeds users hashed with the configured method,
+# then posts logins from concurrent test clients and reports logins per second,
+# per core and at p50/p99. Run from the repository root:
+#
+#     python -m benchmarks.login --threads 16 --logins 400
+#     python -m benchmarks.login --method pbkdf2:sha256:600000 --hash-workers 4
+#
+# Raw verify throughput through the hashing pool is printed first as the ceiling.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import percentile
+
+PASSWORD = 'benchmark-password'
+
+
+def report(name, samples, elapsed, cores):
+    rate = len(samples) / elapsed
+    print(f'{name:28s} p50 {statistics.median(samples) * 1000:8.1f} ms  p99 {percentile(samples, 0.99) * 1000:8.1f} ms'
+          f'  {rate:7.1f}/s  {rate / cores:7.1f}/s per core')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent clients.')
+    parser.add_argument('--method', help='Overrides PASSWORD_HASH_METHOD.')
+    parser.add_argument('--hash-workers', type=int, help='Overrides PASSWORD_HASH_WORKERS.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Configuration is read when the app is imported, so set it up first
+    workdir = tempfile.mkdtemp(prefix='victorygarden-login-bench-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    os.environ['SEARCH_INDEX_PRELOAD'] = 'false'
+    if args.method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.method
+    if args.hash_workers:
+        os.environ['PASSWORD_HASH_WORKERS'] = str(args.hash_workers)
+    warnings.filterwarnings('ignore')
+
+    from sqlalchemy import insert
+    from main import app
+    from models import db, User
+    from passwords import hash_password, verify_password, _workers
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    password_hash = hash_password(PASSWORD)
+    print(f'{password_hash.split("$", 1)[0]}, {_workers} hash workers, {args.threads} clients, {cores} cores',
+          file=sys.stderr)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Everyone shares one hash: the cost per login is the same either way
+        db.session.execute(insert(User), [{
+            'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash,
+            'user_type': 'buyer', 'subscription_tier': 'free', 'mrr': 0.0,
+        } for i in range(args.users)])
+        db.session.commit()
+
+    def timed(call):
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        samples = list(executor.map(lambda _: timed(lambda: verify_password(password_hash, PASSWORD)),
+                                    range(args.logins)))
+    report('verify_password', samples, time.perf_counter() - started, cores)
+
+    rng = random.Random(args.seed)
+    emails = [f'user{rng.randrange(args.users)}@example.com' for _ in range(args.logins)]
+    statuses = []
+
+    def login(email):
+        # A fresh client per login, so each one starts logged out
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/auth/login', data={'email': email, 'password': PASSWORD})
+        statuses.append(response.status_code)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        samples = list(executor.map(login, emails))
+    report('POST /auth/login', samples, time.perf_counter() - started, cores)
+    print(f'statuses {dict((status, statuses.count(status)) for status in sorted(set(statuses)))}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Compares the full meshgrid search in get_optimal_price with the
+# split-threshold search. Run from the repository root:
+#
+#     python -m benchmarks.optimal_price --repeat 3
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from analytics import generate_mock_data, search_optimal_price
+
+
+def measure(model, demand, supply, weather, search):
+    started = time.perf_counter()
+    optimum = search_optimal_price(model, demand, supply, weather, search=search)
+    elapsed = time.perf_counter() - started
+
+    # Separate run for memory: tracing slows Python-level code considerably
+    tracemalloc.start()
+    search_optimal_price(model, demand, supply, weather, search=search)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return optimum, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for run in range(args.repeat):
+        np.random.seed(args.seed + run)
+        dates, demand, supply, price, weather = generate_mock_data()
+        model = RandomForestRegressor(n_estimators=100, random_state=42)
+        model.fit(np.column_stack((demand, supply, weather)), price)
+
+        grid = measure(model, demand, supply, weather, 'grid')
+        thresholds = measure(model, demand, supply, weather, 'thresholds')
+        print(f'run {run}: '
+              f'grid {grid[1]:.2f}s / {grid[2] / 2**20:.0f} MiB, '
+              f'thresholds {thresholds[1]:.2f}s / {thresholds[2] / 2**20:.0f} MiB, '
+              f'optimum {grid[0]:.4f} vs {thresholds[0]:.4f} '
+              f'({"match" if grid[0] == thresholds[0] else "MISMATCH"})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Builds the in-process product search index over a synthetic catalogue and
+# measures query latency, single-threaded and with concurrent clients. Run from
+# the repository root:
+#
+#     python -m benchmarks.search --products 100000 --threads 8 --target-ms 20
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import percentile
+from search import ProductSearchIndex
+
+CROPS = ('tomato', 'carrot', 'lettuce', 'basil', 'pepper', 'squash', 'kale', 'onion', 'garlic', 'bean',
+         'beet', 'radish', 'spinach', 'cucumber', 'melon', 'pumpkin', 'chard', 'leek', 'pea', 'corn')
+QUALIFIERS = ('heirloom', 'cherry', 'sweet', 'spicy', 'purple', 'giant', 'dwarf', 'early', 'late', 'wild',
+              'golden', 'striped', 'crisp', 'tender', 'hardy', 'bush', 'pole', 'mini', 'red', 'white')
+# A catalogue-sized vocabulary: varieties are crop and qualifier words plus a cultivar suffix
+WORDS = CROPS + QUALIFIERS + tuple(f'{word}{n}' for word in CROPS for n in range(50))
+CATEGORIES = ('vegetables', 'fruits', 'herbs', 'seeds', 'seedlings', 'tools')
+TAGS = ('organic', 'easy', 'compact', 'large-scale', 'advanced', 'perennial', 'drought-tolerant')
+
+
+def synthetic_product(rng, product_id):
+    name = ' '.join(rng.sample(WORDS, 2)) + f' {rng.choice(WORDS)}{product_id % 997}'
+    description = ' '.join(rng.choice(WORDS) for _ in range(12))
+    return product_id, name, description, ','.join(rng.sample(TAGS, 2)), rng.choice(CATEGORIES)
+
+
+def timed(index, query):
+    started = time.perf_counter()
+    index.search(query, limit=20)
+    return (time.perf_counter() - started) * 1000
+
+
+def report(name, latencies, target_ms):
+    p99 = percentile(latencies, 0.99)
+    print(f'{name:28s} p50 {statistics.median(latencies):7.2f} ms  p99 {p99:7.2f} ms  '
+          f'{"ok" if p99 <= target_ms else "OVER TARGET"}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--target-ms', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = ProductSearchIndex()
+    started = time.perf_counter()
+    for product_id in range(1, args.products + 1):
+        index.add(*synthetic_product(rng, product_id))
+    elapsed = time.perf_counter() - started
+    print(f'indexed {args.products} products in {elapsed:.1f}s ({args.products / elapsed:.0f}/s)')
+
+    queries = {
+        'single term': [rng.choice(WORDS) for _ in range(args.queries)],
+        'two terms': [' '.join(rng.sample(WORDS, 2)) for _ in range(args.queries)],
+        'autocomplete prefix': [rng.choice(WORDS)[:rng.randint(2, 4)] for _ in range(args.queries)],
+    }
+    for name, batch in queries.items():
+        report(name, [timed(index, query) for query in batch], args.target_ms)
+
+    mixed = [query for batch in queries.values() for query in batch]
+    rng.shuffle(mixed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        latencies = list(executor.map(lambda query: timed(index, query), mixed))
+    report(f'mixed, {args.threads} threads', latencies, args.target_ms)
+    print(f'throughput: {len(mixed) / (time.perf_counter() - started):.0f} queries/s')
+
+    started = time.perf_counter()
+    for product_id in range(args.products + 1, args.products + 1001):
+        index.add(*synthetic_product(rng, product_id))
+    print(f'incremental add: {(time.perf_counter() - started):.3f} ms per product')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Measures what a fresh worker pays to import the app, with and without the
+# analytics engine. Each scenario runs in a new interpreter. Run from the
+# repository root:
+#
+#     python -m benchmarks.startup --repeat 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    'web worker (import main)': 'import main',
+    'analytics worker (ANALYTICS_PRELOAD)': 'import main, analytics; analytics.preload()',
+    'eager analytics (pre-split behaviour)': 'import main, analytics_engine',
+}
+
+PROBE = '''
+import json, resource, time
+started = time.perf_counter()
+{statement}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+'''
+
+
+def run(statement):
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env['ANALYTICS_PRELOAD'] = 'false'
+    output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement)],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, statement in SCENARIOS.items():
+        runs = [run(statement) for _ in range(args.repeat)]
+        seconds = statistics.median(r['seconds'] for r in runs)
+        rss = statistics.median(r['max_rss_mib'] for r in runs)
+        print(f'{name:40s} {seconds * 1000:8.0f} ms {rss:8.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+# Latency statistics shared by the benchmarks
+
+
+def percentile(samples, fraction):
+    # Nearest-rank: the sample at that fraction of the sorted run
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
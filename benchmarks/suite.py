@@ -0,0 +1,260 @@
+# End-to-end benchmark: seeds a database with synthetic users, products and
+# transactions, then measures routes through the Flask test client and the
+# analytics functions at several history lengths. Results are written as JSON
+# so runs from different commits can be compared. Run from the repository root:
+#
+#     python -m benchmarks.suite --users 2000 --products 5000 --transactions 50000
+#     python -m benchmarks.suite --database-url postgresql://localhost/vg_bench
+#     python -m benchmarks.suite --compare benchmarks/results/<earlier run>.json
+#
+# The database is dropped and recreated, so never point it at real data.
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+from benchmarks.stats import percentile
+
+TIERS = (('free', 0.0), ('pro', 9.99), ('premium', 19.99))
+CATEGORIES = ('vegetables', 'fruits', 'herbs', 'seeds', 'seedlings', 'tools')
+TAGS = ('organic', 'easy', 'compact', 'large-scale', 'advanced', 'perennial', 'heirloom')
+PASSWORD = 'benchmark-password'
+
+
+def summarize(samples, statuses=None):
+    total = sum(samples)
+    result = {
+        'runs': len(samples),
+        'p50_ms': statistics.median(samples) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': total / len(samples) * 1000,
+        'throughput_per_s': len(samples) / total if total else None,
+    }
+    if statuses is not None:
+        result['statuses'] = {str(status): statuses.count(status) for status in sorted(set(statuses))}
+    return result
+
+
+def seed(db, args):
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from models import User, Product, ProductTag, Transaction, SubscriptionMetrics
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    # One hash for everyone: hashing thousands of passwords would dominate seeding
+    password_hash = generate_password_hash(PASSWORD)
+
+    users = []
+    for i in range(args.users):
+        tier, mrr = rng.choices(TIERS, weights=(70, 20, 10))[0]
+        users.append({
+            'id': i + 1, 'username': f'user{i}', 'email': f'user{i}@example.com',
+            'password_hash': password_hash, 'user_type': 'admin' if i == 0 else rng.choice(('buyer', 'seller')),
+            'subscription_tier': tier, 'mrr': mrr,
+            'subscription_start_date': now - timedelta(days=rng.randint(1, 300)),
+            'subscription_end_date': now + timedelta(days=rng.randint(-30, 300)) if tier != 'free' else None,
+            'experience': rng.choice(('beginner', 'intermediate', 'expert')),
+            'interests': ','.join(rng.sample(TAGS, 2)), 'garden_size': rng.choice(('small', 'medium', 'large')),
+            'organic_preference': rng.random() < 0.4,
+        })
+    db.session.execute(insert(User), users)
+
+    products, product_tags = [], []
+    for i in range(args.products):
+        tags = rng.sample(TAGS, rng.randint(1, 3))
+        products.append({
+            'id': i + 1, 'name': f'Product {i}', 'description': f'Synthetic product {i}',
+            'price': round(rng.uniform(0.5, 40), 2), 'is_organic': 'organic' in tags,
+            'category': rng.choice(CATEGORIES), 'tags': ','.join(tags),
+            'created_at': now - timedelta(minutes=rng.randint(0, 500000)),
+            'user_id': rng.randint(1, args.users),
+            'latitude': 40.7 + rng.uniform(-0.5, 0.5), 'longitude': -74 + rng.uniform(-0.5, 0.5),
+        })
+        product_tags.extend({'product_id': i + 1, 'tag': tag} for tag in tags)
+    # Core inserts skip the ORM events, so the tag rows are written here directly
+    db.session.execute(insert(Product), products)
+    db.session.execute(insert(ProductTag), product_tags)
+
+    for start in range(0, args.transactions, 10000):
+        payers = [rng.randint(1, args.users) for _ in range(start, min(start + 10000, args.transactions))]
+        db.session.execute(insert(Transaction), [{
+            'user_id': user_id, 'amount': round(rng.uniform(1, 100), 2),
+            'timestamp': now - timedelta(minutes=rng.randint(0, 500000)),
+            'tier': users[user_id - 1]['subscription_tier'],
+        } for user_id in payers])
+    db.session.commit()
+    SubscriptionMetrics.reconcile()
+
+
+def check(name, response):
+    # Timing an error page, or a login bounced back to the form, says nothing about the route
+    if response.status_code >= 400:
+        raise RuntimeError(f'{name} returned {response.status_code}')
+    if name == 'POST /auth/login' and response.location.endswith('/auth/login'):
+        raise RuntimeError(f'{name} was rejected')
+
+
+def bench_routes(app, args):
+    client = app.test_client()
+    routes = {
+        'GET /': lambda: client.get('/'),
+        'GET /marketplace': lambda: client.get('/marketplace'),
+        'POST /auth/login': lambda: client.post('/auth/login', data={
+            'email': f'user{random.randrange(args.users)}@example.com', 'password': PASSWORD}),
+        'GET /admin/mrr_dashboard': lambda: client.get('/admin/mrr_dashboard'),
+    }
+    results = {}
+    for name, call in routes.items():
+        # Each route starts from the same state: the admin logged in, except for login itself
+        client.get('/auth/logout')
+        if name != 'POST /auth/login':
+            with client.session_transaction() as session:
+                session['_user_id'] = '1'
+                session['_fresh'] = True
+        for _ in range(args.warmup):
+            check(name, call())
+            if name == 'POST /auth/login':
+                client.get('/auth/logout')
+        samples, statuses = [], []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = call()
+            samples.append(time.perf_counter() - started)
+            check(name, response)
+            statuses.append(response.status_code)
+            if name == 'POST /auth/login':
+                client.get('/auth/logout')
+        results[name] = summarize(samples, statuses)
+    return results
+
+
+def bench_analytics(app, args):
+    import numpy as np
+    import analytics
+    from models import User
+
+    np.random.seed(args.seed)
+    results = {}
+    store = analytics.observation_store
+    for days in args.days:
+        product = f'benchmark-{days}-days'
+        if not store.length(product):
+            dates, demand, supply, price, weather = analytics.generate_mock_data(days)
+            store.append(product, np.array(dates, dtype='datetime64[D]'),
+                         demand=demand, supply=supply, price=price, weather=weather)
+        for name in ('predict_demand_supply', 'get_market_insights', 'get_optimal_price'):
+            function = getattr(analytics, name)
+            started = time.perf_counter()
+            function(product)
+            cold = time.perf_counter() - started
+            # Later calls reuse the cached and persisted models
+            samples = []
+            for _ in range(args.analytics_repeat):
+                started = time.perf_counter()
+                function(product)
+                samples.append(time.perf_counter() - started)
+            results[f'{name} ({days} days)'] = {'cold_ms': cold * 1000, **summarize(samples)}
+
+    with app.app_context():
+        users = User.query.order_by(User.id).limit(args.requests).all()
+        samples = []
+        for user in users:
+            started = time.perf_counter()
+            analytics.get_product_recommendations(user)
+            samples.append(time.perf_counter() - started)
+        results[f'get_product_recommendations ({args.products} products)'] = summarize(samples)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    for section in ('routes', 'analytics'):
+        for name, result in current[section].items():
+            before = previous.get(section, {}).get(name)
+            if not before:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            print(f'{name:50s} p50 {before["p50_ms"]:9.2f} -> {result["p50_ms"]:9.2f} ms ({change:+.0f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--days', type=int, nargs='+', default=[90, 365, 730],
+                        help='History lengths for the analytics functions.')
+    parser.add_argument('--analytics-repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Defaults to benchmarks/results/<timestamp>-<commit>.json')
+    parser.add_argument('--compare', help='Earlier results file to print p50 changes against.')
+    args = parser.parse_args()
+
+    # Configuration is read when the app is imported, so set it up first
+    workdir = tempfile.mkdtemp(prefix='victorygarden-bench-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    os.environ['SEARCH_INDEX_PRELOAD'] = 'false'
+    os.environ['TIMESERIES_DIR'] = os.path.join(workdir, 'timeseries')
+    os.environ['MODEL_REGISTRY_DIR'] = os.path.join(workdir, 'models')
+    os.environ['TIMESERIES_WINDOW_DAYS'] = str(max(args.days))
+    os.environ['TIMESERIES_MIN_DAYS'] = str(min(args.days))
+    warnings.filterwarnings('ignore')
+
+    from main import app
+    from models import db
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        seed(db, args)
+        print(f'seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'routes': bench_routes(app, args),
+        'analytics': bench_analytics(app, args),
+    }
+
+    for section in ('routes', 'analytics'):
+        for name, result in results[section].items():
+            statuses = f'  statuses {result["statuses"]}' if 'statuses' in result else ''
+            print(f'{name:50s} p50 {result["p50_ms"]:9.2f} ms  p99 {result["p99_ms"]:9.2f} ms'
+                  f'  {result["throughput_per_s"]:9.1f}/s{statuses}')
+
+    output = args.output or os.path.join(
+        'benchmarks', 'results', f'{results["timestamp"].replace(":", "")}-{results["commit"] or "unknown"}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'wrote {output}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
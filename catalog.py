@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import exists, tuple_
+from sqlalchemy.orm import joinedload, load_only
+from models import Product, ProductTag, User, normalize_tags
+
+PAGE_SIZE = 24
+MAX_TAGS = 5
+
+# sort name -> (column, descending)
+SORTS = {
+    'newest': (Product.created_at, True),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+}
+
+
+def encode_cursor(sort, product):
+    value = getattr(product, SORTS[sort][0].key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, product.id]).encode()).decode()
+
+
+def decode_cursor(sort, cursor):
+    try:
+        value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(value) if sort == 'newest' else float(value)
+        return value, int(product_id)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError('Invalid cursor') from None
+
+
+def browse_products(category=None, tag=None, organic=None, sort='newest', after=None, per_page=PAGE_SIZE):
+    # Keyset pagination: each page continues from the (sort value, id) of the
+    # last row shown, so deep pages cost the same as the first one.
+    if sort not in SORTS:
+        raise ValueError(f'Unknown sort: {sort}')
+    column, descending = SORTS[sort]
+
+    query = Product.query.options(joinedload(Product.seller).options(load_only(User.id, User.username)))
+    if category:
+        query = query.filter(Product.category == category)
+    if organic is not None:
+        query = query.filter(Product.is_organic.is_(organic))
+    # Comma-separated tags match products carrying all of them
+    tags = normalize_tags(tag)
+    if len(tags) > MAX_TAGS:
+        raise ValueError(f'At most {MAX_TAGS} tags')
+    for name in tags:
+        query = query.filter(exists().where(ProductTag.product_id == Product.id, ProductTag.tag == name))
+
+    if after:
+        position = tuple_(column, Product.id)
+        value = decode_cursor(sort, after)
+        query = query.filter(position < value if descending else position > value)
+    if descending:
+        query = query.order_by(column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(column, Product.id)
+
+    products = query.limit(per_page + 1).all()
+    next_cursor = encode_cursor(sort, products[per_page - 1]) if len(products) > per_page else None
+    return products[:per_page], next_cursor
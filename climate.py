@@ -0,0 +1,135 @@
+import math
+import os
+import struct
+import threading
+import uuid
+import zlib
+
+import numpy as np
+
+from cache import TTLCache
+
+# Cells per degree of the global raster (0.1 degree cells, 1800 x 3600)
+RESOLUTION = 10
+TILE_SIZE = 256
+# Raster values are USDA half zones: 1 = 1a, 2 = 1b, ... 26 = 13b; 0 = no data
+HALF_ZONES = 26
+
+# Green (cold-hardy) through red (tropical), one colour per half zone
+PALETTE = [(0, 0, 0)] + [
+    (int(255 * min(1, 2 * t)), int(255 * min(1, 2 - 2 * t)), 0)
+    for t in np.linspace(0, 1, HALF_ZONES)
+]
+TILE_ALPHA = 140
+
+
+def zone_label(value):
+    if not value:
+        return None
+    return f'{(value + 1) // 2}{"a" if value % 2 else "b"}'
+
+
+def build_zone_raster(path):
+    # Synthetic latitude model standing in for a gridded climate dataset: the
+    # average annual extreme minimum falls about 1.45 F per degree from the
+    # equator, and each 5 F band is one half zone.
+    latitudes = 90 - (np.arange(180 * RESOLUTION) + 0.5) / RESOLUTION
+    extreme_min_f = 65 - 1.45 * np.abs(latitudes)
+    half_zones = np.clip(np.floor((extreme_min_f + 60) / 5) + 1, 1, HALF_ZONES).astype(np.uint8)
+    raster = np.repeat(half_zones[:, None], 360 * RESOLUTION, axis=1)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per writer: several workers may build the raster at once on a cold start
+    temporary = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+    with open(temporary, 'wb') as f:
+        np.save(f, raster)
+    os.replace(temporary, path)
+
+
+def _png(pixels, palette, alpha):
+    # 8-bit indexed PNG: one filter byte (none) per row, then the palette indices
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    height, width = pixels.shape
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), pixels])
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        chunk(b'PLTE', bytes(channel for colour in palette for channel in colour)),
+        chunk(b'tRNS', bytes([0] + [alpha] * (len(palette) - 1))),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)),
+        chunk(b'IEND', b''),
+    ])
+
+
+class ClimateZones:
+    def __init__(self, path, max_tiles=2048):
+        self.path = path
+        self._raster = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._tiles = TTLCache(max_entries=max_tiles, ttl=None)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            build_zone_raster(self.path)
+        stat = os.stat(self.path)
+        self._raster = np.load(self.path, mmap_mode='r')
+        self._version = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+        self._tiles.clear()
+
+    @property
+    def raster(self):
+        if self._raster is None:
+            with self._lock:
+                if self._raster is None:
+                    self._load()
+        return self._raster
+
+    @property
+    def version(self):
+        # Version of the raster this process serves; a file rebuilt by another
+        # process is picked up here, before its tiles are tagged with the new version
+        self.raster
+        try:
+            stat = os.stat(self.path)
+            current = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+        except FileNotFoundError:
+            current = None
+        if current != self._version:
+            with self._lock:
+                self._load()
+        return self._version
+
+    def rebuild(self):
+        build_zone_raster(self.path)
+        with self._lock:
+            self._load()
+
+    def _cells(self, lat, lng):
+        rows, cols = self.raster.shape
+        row = np.clip(((90 - np.asarray(lat)) * RESOLUTION).astype(int), 0, rows - 1)
+        col = np.clip(((np.asarray(lng) + 180) * RESOLUTION).astype(int) % cols, 0, cols - 1)
+        return row, col
+
+    def zone_at(self, lat, lng):
+        row, col = self._cells(lat, lng)
+        return zone_label(int(self.raster[row, col]))
+
+    def tile(self, z, x, y):
+        # Web Mercator tile as a palette PNG, sampled from the raster at pixel centres
+        key = (z, x, y)
+        cached = self._tiles.get(key)
+        if cached is not None:
+            return cached
+        scale = TILE_SIZE * 2 ** z
+        pixel = np.arange(TILE_SIZE) + 0.5
+        lng = (x * TILE_SIZE + pixel) / scale * 360 - 180
+        mercator_y = math.pi * (1 - 2 * (y * TILE_SIZE + pixel) / scale)
+        lat = np.degrees(np.arctan(np.sinh(mercator_y)))
+        row, _ = self._cells(lat, 0)
+        _, col = self._cells(0, lng)
+        image = _png(np.ascontiguousarray(self.raster[np.ix_(row, col)]), PALETTE, TILE_ALPHA)
+        self._tiles.set(key, image)
+        return image
@@ -1,9 +1,71 @@
 import os
 
+def engine_options(url, statement_timeout_ms=0):
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    # SQLite uses its own pools, which take no sizing arguments
+    if url and not url.startswith('sqlite'):
+        options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+        options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+        if statement_timeout_ms and url.startswith('postgres'):
+            options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
+
 class Config:
     SECRET_KEY = os.urandom(32)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI,
+                                               int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0)))
+    # Read-only replica for dashboard and analytics reads (see models.replica_reads)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {
+        'replica': {
+            'url': DATABASE_REPLICA_URL,
+            **engine_options(DATABASE_REPLICA_URL, int(os.environ.get('DB_REPLICA_STATEMENT_TIMEOUT_MS', 0))),
+        },
+    } if DATABASE_REPLICA_URL else {}
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
+    # Point at a local stripe-mock (e.g. http://localhost:12111) for development and tests
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')
+    STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get('STRIPE_MAX_NETWORK_RETRIES', 2))
+    STRIPE_TIMEOUT = int(os.environ.get('STRIPE_TIMEOUT', 30))
+    STRIPE_POOL_SIZE = int(os.environ.get('STRIPE_POOL_SIZE', 10))
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
+    FORECAST_CACHE_MAX_ENTRIES = int(os.environ.get('FORECAST_CACHE_MAX_ENTRIES', 256))
+    FORECAST_CACHE_TTL = int(os.environ.get('FORECAST_CACHE_TTL', 7 * 24 * 3600))
+    # sarimax (default), or one of the vectorised backends in forecasting.py: ridge, seasonal_naive
+    FORECAST_BACKEND = os.environ.get('FORECAST_BACKEND', 'sarimax')
+    FORECAST_REFIT_AFTER = int(os.environ.get('FORECAST_REFIT_AFTER', 7))
+    FORECAST_WORKERS = int(os.environ['FORECAST_WORKERS']) if os.environ.get('FORECAST_WORKERS') else None
+    FORECAST_SCHEDULE_INTERVAL = int(os.environ.get('FORECAST_SCHEDULE_INTERVAL', 0))
+    MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'models'))
+    TIMESERIES_DIR = os.environ.get('TIMESERIES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'timeseries'))
+    TIMESERIES_WINDOW_DAYS = int(os.environ.get('TIMESERIES_WINDOW_DAYS', 365))
+    TIMESERIES_MIN_DAYS = int(os.environ.get('TIMESERIES_MIN_DAYS', 60))
+    # Artifacts kept per model and product; older versions are deleted on save
+    MODEL_REGISTRY_KEEP_VERSIONS = int(os.environ.get('MODEL_REGISTRY_KEEP_VERSIONS', 3))
+    MODEL_REGISTRY_PRELOAD = os.environ.get('MODEL_REGISTRY_PRELOAD', 'true').lower() == 'true'
+    CLIMATE_RASTER_PATH = os.environ.get('CLIMATE_RASTER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'climate_zones.npy'))
+    # werkzeug hash method and cost, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000.
+    # Stored hashes made with other parameters are upgraded on the next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ['PASSWORD_HASH_WORKERS']) if os.environ.get('PASSWORD_HASH_WORKERS') else None
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+    # Per-process cache of logged-in users' identity; edits reach other workers within the TTL
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 24 * 3600))
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 20))
+    # Requests slower than this, or repeating one statement this often, are logged
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+    # Build the in-process product search index in the background at start-up instead of on the first search
+    SEARCH_INDEX_PRELOAD = os.environ.get('SEARCH_INDEX_PRELOAD', 'true').lower() == 'true'
+    # Import the analytics engine at start-up; only worth it for processes that serve analytics
+    ANALYTICS_PRELOAD = os.environ.get('ANALYTICS_PRELOAD', 'false').lower() == 'true'
@@ -1,6 +1,5 @@
 from main import app, db
 from models import User
-from werkzeug.security import generate_password_hash
 
 def create_admin_user():
     with app.app_context():
@@ -13,7 +12,7 @@ def create_admin_user():
                 email='admin@victorygarden.io',
                 user_type='admin'
             )
-            admin.password_hash = generate_password_hash('admin123')  # Set a secure password in production
+            admin.set_password('admin123')  # Set a secure password in production
             db.session.add(admin)
             db.session.commit()
             print("Admin user created successfully.")
@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, FloatField, SelectField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
-from models import User
+from wtforms.validators import DataRequired, Email, EqualTo, Length
+from sqlalchemy import or_
+from models import User, db
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -16,15 +17,17 @@ class RegistrationForm(FlaskForm):
     password2 = PasswordField('Repeat Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Register')
 
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None:
-            raise ValidationError('Please use a different username.')
-
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None:
-            raise ValidationError('Please use a different email address.')
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators):
+            return False
+        # Both columns have unique indexes, so one OR query answers both checks
+        taken = db.session.query(User.username, User.email).filter(
+            or_(User.username == self.username.data, User.email == self.email.data)).limit(2).all()
+        if any(username == self.username.data for username, _ in taken):
+            self.username.errors.append('Please use a different username.')
+        if any(email == self.email.data for _, email in taken):
+            self.email.errors.append('Please use a different email address.')
+        return not taken
 
 class ProductForm(FlaskForm):
     name = StringField('Product Name', validators=[DataRequired(), Length(max=100)])
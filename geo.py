@@ -0,0 +1,43 @@
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# From this zoom level on the map shows individual listings instead of clusters
+CLUSTER_MAX_ZOOM = 14
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cluster_precision(zoom):
+    # Keeps a viewport to roughly ten cells across: each geohash character
+    # narrows cells by ~2.5 zoom levels (precision 3 is ~156 km, 5 is ~4.9 km)
+    return max(1, min(5, round(zoom * 0.4)))
+
+
+def parse_bbox(value):
+    # "south,west,north,east" in degrees, as produced by LatLngBounds.toUrlValue()
+    try:
+        south, west, north, east = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('bbox must be "south,west,north,east"') from None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('bbox is out of range')
+    return south, west, north, east
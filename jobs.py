@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from models import db, Product, ForecastResult
+from metrics import record_stage_timings
+
+logger = logging.getLogger(__name__)
+
+# Stored result kind -> analytics function that produces it
+ANALYTICS_TASKS = {
+    'demand_supply': 'predict_demand_supply',
+    'market_insights': 'get_market_insights',
+    'optimal_price': 'get_optimal_price',
+}
+
+MAX_TRACKED_JOBS = 1000
+
+
+def preload_models():
+    # Worker start-up: load the engine and map stored models before the first job arrives
+    import analytics
+    analytics.preload()
+
+
+def run_analytics(product_name, kinds):
+    # Runs inside a worker process; analytics is imported there, not in the web process
+    import analytics
+    from metrics import drain_stage_timings
+    results = {kind: getattr(analytics, ANALYTICS_TASKS[kind])(product_name) for kind in kinds}
+    # Stage timings recorded in this worker travel back with the results
+    return results, drain_stage_timings()
+
+
+class ForecastJobQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._scheduler = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('FORECAST_WORKERS', None)
+        app.config.setdefault('FORECAST_SCHEDULE_INTERVAL', 0)
+        app.config.setdefault('MODEL_REGISTRY_PRELOAD', False)
+        app.extensions['forecast_jobs'] = self
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.app.config['FORECAST_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=preload_models if self.app.config['MODEL_REGISTRY_PRELOAD'] else None)
+            return self._executor
+
+    def enqueue(self, product, kinds=tuple(ANALYTICS_TASKS)):
+        product_id = product.id
+        with self._lock:
+            job_id = self._pending.get(product_id)
+            if job_id is not None:
+                return job_id
+
+            job_id = uuid.uuid4().hex
+            future = self.executor.submit(run_analytics, product.name, list(kinds))
+            self._jobs[job_id] = {
+                'id': job_id,
+                'product_id': product_id,
+                'kinds': list(kinds),
+                'submitted_at': datetime.utcnow(),
+                'finished_at': None,
+                'error': None,
+                'future': future,
+            }
+            self._pending[product_id] = job_id
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        future.add_done_callback(lambda f: self._store(job_id, product_id, f))
+        return job_id
+
+    def enqueue_all(self):
+        products = Product.query.with_entities(Product.id, Product.name).all()
+        return [self.enqueue(product) for product in products]
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job['future']
+        if job['finished_at'] is not None:
+            state = 'failed' if job['error'] else 'finished'
+        elif future.running() or future.done():
+            state = 'running'
+        else:
+            state = 'queued'
+        return {
+            'id': job['id'],
+            'product_id': job['product_id'],
+            'kinds': job['kinds'],
+            'status': state,
+            'submitted_at': job['submitted_at'].isoformat(),
+            'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None,
+            'error': job['error'],
+        }
+
+    def _store(self, job_id, product_id, future):
+        job = self._jobs.get(job_id)
+        try:
+            results, timings = future.result()
+            record_stage_timings(timings)
+            with self.app.app_context():
+                for kind, payload in results.items():
+                    ForecastResult.store(product_id, kind, payload)
+                db.session.commit()
+        except Exception as e:
+            logger.exception('Forecast job %s for product %s failed', job_id, product_id)
+            if job is not None:
+                job['error'] = str(e)
+        finally:
+            with self._lock:
+                if self._pending.get(product_id) == job_id:
+                    del self._pending[product_id]
+            if job is not None:
+                job['finished_at'] = datetime.utcnow()
+
+    def start_scheduler(self, interval=None):
+        interval = interval or self.app.config['FORECAST_SCHEDULE_INTERVAL']
+        if not interval or self._scheduler is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    with self.app.app_context():
+                        self.enqueue_all()
+                except Exception:
+                    logger.exception('Scheduled forecast refresh failed')
+                self._stop.wait(interval)
+
+        self._scheduler = threading.Thread(target=loop, name='forecast-scheduler', daemon=True)
+        self._scheduler.start()
+
+    def run_scheduler(self, interval=None):
+        # Blocking entry point for a dedicated worker process (flask forecast-worker);
+        # WSGI servers never run main.py as __main__, so they never start the scheduler
+        interval = interval or self.app.config['FORECAST_SCHEDULE_INTERVAL']
+        if not interval:
+            raise ValueError('Set FORECAST_SCHEDULE_INTERVAL or pass an interval')
+        self.start_scheduler(interval)
+        try:
+            while not self._stop.wait(1):
+                pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+forecast_jobs = ForecastJobQueue()
@@ -1,10 +1,15 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+import click
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, login_required, current_user
-from models import db, User, Subscription, Transaction
-from sqlalchemy import func
+from models import db, User, Subscription, SubscriptionMetrics, Transaction, Product, ForecastResult, replica_reads
 from config import Config
+from catalog import browse_products
+from user_cache import load_cached_user
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -13,12 +18,30 @@ migrate = Migrate(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'auth.login'
 
+import metrics
+metrics.init_app(app)
+
 from auth import auth as auth_blueprint
 app.register_blueprint(auth_blueprint, url_prefix='/auth')
 
+from jobs import forecast_jobs
+forecast_jobs.init_app(app)
+
+from api import api as api_blueprint
+app.register_blueprint(api_blueprint, url_prefix='/api')
+if app.config['SEARCH_INDEX_PRELOAD']:
+    from search import catalog_search
+    catalog_search.start(app)
+from api_v1 import api_v1 as api_v1_blueprint
+app.register_blueprint(api_v1_blueprint, url_prefix='/api/v1')
+
+if app.config['ANALYTICS_PRELOAD']:
+    import analytics
+    analytics.preload()
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_cached_user(int(user_id))
 
 @app.route('/')
 def index():
@@ -29,11 +52,60 @@ def index():
 def profile():
     return render_template('profile.html')
 
+def _browse(category=None):
+    sort = request.args.get('sort', 'newest')
+    organic = {'true': True, 'false': False}.get(request.args.get('organic'))
+    tag = request.args.get('tag') or None
+    try:
+        products, next_cursor = browse_products(category=category, tag=tag, organic=organic,
+                                                sort=sort, after=request.args.get('after'))
+    except ValueError:
+        abort(400)
+    filters = {'sort': sort, 'tag': tag, 'organic': request.args.get('organic')}
+    next_url = None
+    if next_cursor:
+        next_url = url_for(request.endpoint, **(request.view_args or {}),
+                           **{key: value for key, value in filters.items() if value}, after=next_cursor)
+    return products, next_url, filters
+
 @app.route('/marketplace')
 def marketplace():
-    # Add logic to fetch products or other marketplace data
-    products = []  # Replace this with actual product data
-    return render_template('marketplace.html', products=products)
+    products, next_url, filters = _browse()
+    return render_template('marketplace.html', products=products, next_url=next_url, filters=filters)
+
+@app.route('/marketplace/<category>')
+def marketplace_category(category):
+    products, next_url, filters = _browse(category)
+    return render_template('marketplace_category.html', category=category, products=products,
+                           next_url=next_url, filters=filters)
+
+@app.route('/product/<int:product_id>')
+def product_detail(product_id):
+    product = Product.query.get_or_404(product_id)
+    return render_template('product.html', product=product)
+
+@app.route('/checkout/<int:product_id>', methods=['POST'])
+@login_required
+def checkout(product_id):
+    import stripe
+    from payments import create_checkout_session
+    product = Product.query.get_or_404(product_id)
+    try:
+        session = create_checkout_session(product, user=current_user)
+    except stripe.StripeError as e:
+        db.session.rollback()
+        app.logger.warning('Checkout for product %s failed: %s', product_id, e)
+        flash('We could not start the checkout. Please try again in a moment.')
+        return redirect(url_for('product_detail', product_id=product_id))
+    db.session.commit()
+    return redirect(session.url, code=303)
+
+@app.route('/analytics')
+@login_required
+@replica_reads()
+def analytics_dashboard():
+    products = Product.query.with_entities(Product.name).distinct().order_by(Product.name).all()
+    return render_template('analytics.html', products=products)
 
 @app.route('/educational_resources')
 def educational_resources():
@@ -43,28 +115,146 @@ def educational_resources():
 
 @app.route('/admin/mrr_dashboard')
 @login_required
+@replica_reads()
 def mrr_dashboard():
     if not current_user.is_authenticated or current_user.user_type != 'admin':
         flash('You do not have permission to access this page.')
         return redirect(url_for('index'))
 
-    total_mrr = User.calculate_total_mrr()
-    total_users = User.query.count()
-    paying_users = User.query.filter(User.subscription_tier != 'free').count()
+    # Maintained incrementally on every subscription change; see SubscriptionMetrics
+    metrics = SubscriptionMetrics.summary()
+    total_mrr = metrics['total_mrr']
+    total_users = metrics['total_users']
+    paying_users = metrics['paying_users']
     arpu = total_mrr / total_users if total_users > 0 else 0
 
-    subscription_breakdown = db.session.query(
-        User.subscription_tier,
-        func.count(User.id).label('count'),
-        func.sum(User.mrr).label('revenue')
-    ).group_by(User.subscription_tier).all()
-
     return render_template('admin/mrr_dashboard.html',
                            total_mrr=total_mrr,
                            total_users=total_users,
                            paying_users=paying_users,
                            arpu=arpu,
-                           subscription_breakdown=subscription_breakdown)
+                           subscription_breakdown=metrics['breakdown'])
+
+@app.route('/admin/revenue_dashboard')
+@login_required
+@replica_reads()
+def revenue_dashboard():
+    if not current_user.is_authenticated or current_user.user_type != 'admin':
+        flash('You do not have permission to access this page.')
+        return redirect(url_for('index'))
+
+    from rollups import revenue_by_tier
+    tier_revenue = revenue_by_tier()
+    users_by_tier = [(tier, count) for tier, count, _ in SubscriptionMetrics.summary()['breakdown']]
+
+    return render_template('admin/revenue_dashboard.html',
+                           total_revenue=sum(revenue for _, revenue in tier_revenue),
+                           revenue_by_tier=tier_revenue,
+                           users_by_tier=users_by_tier)
+
+@app.route('/admin/revenue_data')
+@login_required
+@replica_reads()
+def revenue_data():
+    if current_user.user_type != 'admin':
+        abort(403)
+
+    from rollups import revenue_series
+    try:
+        end = date.fromisoformat(request.args['end']) if 'end' in request.args else date.today()
+        start = date.fromisoformat(request.args['start']) if 'start' in request.args else end - timedelta(days=90)
+        return jsonify(revenue_series(request.args.get('granularity', 'day'), start, end,
+                                      tier=request.args.get('tier')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.cli.command('update-revenue-rollups')
+def update_revenue_rollups_command():
+    """Fold transactions recorded since the last run into the revenue rollups."""
+    from rollups import update_revenue_rollups
+    click.echo(f'Rolled up {update_revenue_rollups()} transactions.')
+
+@app.cli.command('expire-subscriptions')
+def expire_subscriptions():
+    """Move every lapsed paid subscription back to the free tier."""
+    click.echo(f'Expired {User.expire_lapsed_subscriptions()} subscriptions.')
+
+@app.cli.command('forecast-all')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to the CPU count).')
+@click.option('--chunksize', type=int, default=8, help='Products per worker task.')
+def forecast_all(workers, chunksize):
+    """Forecast demand, supply and price for every product."""
+    import analytics
+    product_ids = defaultdict(list)
+    for product_id, name in Product.query.with_entities(Product.id, Product.name):
+        product_ids[name].append(product_id)
+
+    stored = uncommitted = 0
+    for result in analytics.forecast_batch(product_ids, max_workers=workers, chunksize=chunksize):
+        if 'error' in result:
+            click.echo(f"Forecast failed for {result['product']}: {result['error']}", err=True)
+            continue
+        for product_id in product_ids[result['product']]:
+            ForecastResult.store(product_id, 'demand_supply', result)
+            stored += 1
+            uncommitted += 1
+        # A separate counter: stored can step over a multiple of 100 when a name maps to several products
+        if uncommitted >= 100:
+            db.session.commit()
+            uncommitted = 0
+    db.session.commit()
+    click.echo(f'Stored {stored} forecasts.')
+
+@app.cli.command('forecast-worker')
+@click.option('--interval', type=int, default=None,
+              help='Seconds between refreshes (defaults to FORECAST_SCHEDULE_INTERVAL).')
+def forecast_worker(interval):
+    """Refresh every product's stored analytics on a schedule until interrupted."""
+    click.echo('Forecast worker started; press Ctrl+C to stop.')
+    try:
+        forecast_jobs.run_scheduler(interval)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('recompute-recommendations')
+def recompute_recommendations():
+    """Rebuild every user's cached product recommendations, e.g. after a catalog import."""
+    from recommendations import prune_recommendations, recompute_all_recommendations
+    pruned = prune_recommendations()
+    recomputed = recompute_all_recommendations()
+    click.echo(f'Pruned {pruned} stale entries, recomputed {recomputed} users.')
+
+@app.cli.command('reconcile-subscription-metrics')
+def reconcile_subscription_metrics():
+    """Recompute subscription aggregates from the user table and report drift."""
+    drift = SubscriptionMetrics.reconcile()
+    for row in drift:
+        click.echo(f"{row['tier']}: users {row['stored_users']} -> {row['actual_users']}, "
+                   f"revenue {row['stored_revenue']:.2f} -> {row['actual_revenue']:.2f}")
+    click.echo(f'{len(drift)} tier(s) corrected.')
+
+@app.cli.command('ingest-observations')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def ingest_observations(path):
+    """Append daily product observations from a CSV (product,date,demand,supply,price,weather)."""
+    from timeseries import TimeSeriesStore, ingest_csv
+    appended = ingest_csv(TimeSeriesStore(app.config['TIMESERIES_DIR']), path)
+    for product, rows in sorted(appended.items()):
+        click.echo(f'{product}: {rows} new observations')
+    click.echo(f'Ingested {sum(appended.values())} observations for {len(appended)} product(s).')
+
+@app.cli.command('build-climate-raster')
+def build_climate_raster():
+    """Rebuild the precomputed climate-zone raster served as map tiles."""
+    from api import climate_zones
+    zones = climate_zones()
+    zones.rebuild()
+    click.echo(f'Wrote {zones.path} ({zones.raster.shape[0]} x {zones.raster.shape[1]} cells).')
 
 if __name__ == '__main__':
+    # Only start the scheduler in the reloader's child process, not the watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        forecast_jobs.start_scheduler()
     app.run(host='0.0.0.0', port=5000, debug=True)
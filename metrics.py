@@ -0,0 +1,154 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+STAGE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}  # sorted label items -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{_format_labels(key + (("le", bound),))}}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{_format_labels(key + (("le", "+Inf"),))}}} {values[-1]}')
+            labels = f'{{{_format_labels(key)}}}' if key else ''
+            lines.append(f'{self.name}_sum{labels} {values[-2]}')
+            lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS)
+request_queries = Histogram('http_request_db_queries', 'SQL statements executed per request.', QUERY_COUNT_BUCKETS)
+request_query_time = Histogram('http_request_db_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS)
+analytics_stage_duration = Histogram('analytics_stage_duration_seconds',
+                                     'Duration of analytics stages (model fits, forecasts, searches).',
+                                     STAGE_BUCKETS)
+HISTOGRAMS = (request_duration, request_queries, request_query_time, analytics_stage_duration)
+
+# Stage timings since the last drain, so forecast worker processes can hand
+# theirs back to the web process along with the job results
+_recent_stages = deque(maxlen=1000)
+
+
+@contextmanager
+def stage_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        analytics_stage_duration.observe(elapsed, stage=stage)
+        _recent_stages.append((stage, elapsed))
+
+
+def drain_stage_timings():
+    timings = []
+    while _recent_stages:
+        timings.append(_recent_stages.popleft())
+    return timings
+
+
+def record_stage_timings(timings):
+    for stage, elapsed in timings:
+        analytics_stage_duration.observe(elapsed, stage=stage)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_query_time += time.perf_counter() - context._metrics_started
+        g.metrics_statements[statement] += 1
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_query_time = 0.0
+    g.metrics_statements = Counter()
+
+
+def _after_request(response):
+    if 'metrics_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    endpoint = request.endpoint or 'unmatched'
+    queries = sum(g.metrics_statements.values())
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    request_queries.observe(queries, endpoint=endpoint)
+    request_query_time.observe(g.metrics_query_time, endpoint=endpoint)
+
+    if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+        logger.warning('Slow request: %s %s took %.0f ms (%d queries, %.0f ms in SQL)',
+                       request.method, request.path, elapsed * 1000, queries, g.metrics_query_time * 1000)
+    # The same statement issued over and over is the signature of lazy loading in a loop
+    repeated = [(statement, count) for statement, count in g.metrics_statements.most_common(3)
+                if count >= current_app.config['N_PLUS_ONE_THRESHOLD']]
+    for statement, count in repeated:
+        logger.warning('Possible N+1 in %s %s: statement ran %d times: %s',
+                       request.method, request.path, count, ' '.join(statement.split())[:200])
+    return response
+
+
+def expose():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', 10)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(expose(), mimetype='text/plain; version=0.0.4')
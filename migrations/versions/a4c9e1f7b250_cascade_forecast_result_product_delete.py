@@ -0,0 +1,39 @@
+"""Cascade product deletes to forecast_result
+
+Revision ID: a4c9e1f7b250
+Revises: 6f1d4a9c8e23
+Create Date: 2026-10-18 23:41:08.217604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9e1f7b250'
+down_revision = '6f1d4a9c8e23'
+branch_labels = None
+depends_on = None
+
+# The constraint was created unnamed, so its name depends on the database: read
+# it back. SQLite reports none, and batch mode names the reflected copy by this
+# convention instead so it can be dropped.
+naming_convention = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _product_fk_name():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('forecast_result'):
+        if fk['constrained_columns'] == ['product_id']:
+            return fk['name'] or 'fk_forecast_result_product_id_product'
+
+
+def upgrade():
+    with op.batch_alter_table('forecast_result', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(_product_fk_name(), type_='foreignkey')
+        batch_op.create_foreign_key('forecast_result_product_id_fkey', 'product', ['product_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('forecast_result', schema=None) as batch_op:
+        batch_op.drop_constraint('forecast_result_product_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('forecast_result_product_id_fkey', 'product', ['product_id'], ['id'])
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+from urllib.parse import quote, unquote
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIX = '.joblib'
+
+
+def data_version(*arrays):
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()[:16]
+
+
+class ModelRegistry:
+    def __init__(self, root, max_loaded=256, keep_versions=3):
+        self.root = root
+        self.keep_versions = keep_versions
+        self._loaded = TTLCache(max_entries=max_loaded, ttl=None)
+
+    def _product_dir(self, kind, product):
+        return os.path.join(self.root, kind, quote(product, safe=''))
+
+    def _artifact_path(self, kind, product, version):
+        return os.path.join(self._product_dir(kind, product), version + ARTIFACT_SUFFIX)
+
+    def latest_version(self, kind, product):
+        try:
+            with open(os.path.join(self._product_dir(kind, product), 'LATEST')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, kind, product, version, model):
+        import joblib
+        directory = self._product_dir(kind, product)
+        os.makedirs(directory, exist_ok=True)
+        path = self._artifact_path(kind, product, version)
+        # Write then rename so concurrent readers never see a partial artifact
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+
+        latest_tmp = os.path.join(directory, f'LATEST.{os.getpid()}.tmp')
+        with open(latest_tmp, 'w') as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(directory, 'LATEST'))
+        self._loaded.set((kind, product, version), model)
+        self.prune(kind, product, keep=version)
+        return path
+
+    def prune(self, kind, product, keep=None):
+        # Keep the newest keep_versions artifacts (by write time) plus `keep`
+        directory = self._product_dir(kind, product)
+        try:
+            entries = [entry for entry in os.scandir(directory) if entry.name.endswith(ARTIFACT_SUFFIX)]
+        except FileNotFoundError:
+            return 0
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        removed = 0
+        for entry in entries[self.keep_versions:]:
+            version = entry.name[:-len(ARTIFACT_SUFFIX)]
+            if version == keep:
+                continue
+            try:
+                # Processes that already mapped the file keep their view of it
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._loaded.pop((kind, product, version))
+            removed += 1
+        return removed
+
+    def load(self, kind, product, version=None, mmap_mode='c'):
+        version = version or self.latest_version(kind, product)
+        if version is None:
+            return None
+        key = (kind, product, version)
+        model = self._loaded.get(key)
+        if model is not None:
+            return model
+
+        path = self._artifact_path(kind, product, version)
+        if not os.path.exists(path):
+            return None
+        import joblib
+        try:
+            # Large numpy arrays are mapped from disk (copy-on-write) rather than read into memory
+            model = joblib.load(path, mmap_mode=mmap_mode)
+        except Exception:
+            logger.exception('Could not load model artifact %s', path)
+            return None
+        self._loaded.set(key, model)
+        return model
+
+    def preload(self, kinds=None):
+        loaded = 0
+        if not os.path.isdir(self.root):
+            return loaded
+        for kind in kinds or os.listdir(self.root):
+            kind_dir = os.path.join(self.root, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for product in os.listdir(kind_dir):
+                if self.load(kind, unquote(product)) is not None:
+                    loaded += 1
+        return loaded
@@ -1,28 +1,67 @@
+import math
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_login import UserMixin
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, event, inspect, select
+from sqlalchemy.orm import Session
+from geo import encode_geohash
+from passwords import hash_password, verify_password, needs_rehash
 
-db = SQLAlchemy()
+class RoutingSession(FlaskSession):
+    # Inside replica_reads() queries go to the 'replica' bind when one is
+    # configured. Flushes, and everything outside the block, use the primary.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@contextmanager
+def replica_reads():
+    # Replicas lag the primary: only use this for reads that tolerate that
+    session = db.session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield
+    finally:
+        session.info['use_replica'] = previous
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     user_type = db.Column(db.String(20))
-    subscription_tier = db.Column(db.String(20), default='free')
+    # active_history so the previous tier/MRR is known when updating SubscriptionMetrics
+    subscription_tier = db.column_property(db.Column(db.String(20), default='free'), active_history=True)
     subscription_start_date = db.Column(db.DateTime)
     subscription_end_date = db.Column(db.DateTime)
     last_payment_date = db.Column(db.DateTime)
-    mrr = db.Column(db.Float, default=0.0)
+    mrr = db.column_property(db.Column(db.Float, default=0.0), active_history=True)
+    experience = db.Column(db.String(20))
+    interests = db.Column(db.String(255))
+    garden_size = db.Column(db.String(20))
+    preferred_products = db.Column(db.String(255))
+    organic_preference = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        db.Index('ix_user_tier_end_date', 'subscription_tier', 'subscription_end_date'),
+    )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
     def start_subscription(self, tier, price):
         self.subscription_tier = tier
@@ -44,14 +83,163 @@ class User(UserMixin, db.Model):
     def calculate_user_mrr(self):
         if self.subscription_tier == 'free':
             return 0.0
-        elif datetime.utcnow() > self.subscription_end_date:
+        elif self.subscription_end_date is None or datetime.utcnow() > self.subscription_end_date:
             return 0.0
         else:
             return self.mrr
 
     @staticmethod
-    def calculate_total_mrr():
-        return db.session.query(func.sum(User.mrr)).scalar() or 0.0
+    def lapsed_subscription(now=None):
+        # Paid tiers past their end date; served by ix_user_tier_end_date
+        now = now or datetime.utcnow()
+        return db.and_(User.subscription_tier != 'free', User.subscription_end_date < now)
+
+    @staticmethod
+    def expire_lapsed_subscriptions(now=None, batch_size=500):
+        lapsed = User.lapsed_subscription(now)
+        # Lock the lapsed rows and note what they held, so SubscriptionMetrics
+        # moves by exactly what the UPDATE changes in the same transaction
+        lapsing = {user_id: (tier, mrr or 0.0) for user_id, tier, mrr in db.session.query(
+            User.id, User.subscription_tier, User.mrr).filter(lapsed).with_for_update()}
+
+        # Set-based UPDATEs that bypass the per-row mapper events on purpose. The
+        # lapsed condition is repeated so a row renewed since the SELECT (where
+        # FOR UPDATE is unsupported, as on SQLite) is neither expired nor counted.
+        expired = []
+        user_ids = list(lapsing)
+        for start in range(0, len(user_ids), batch_size):
+            expired.extend(db.session.execute(
+                db.update(User).where(User.id.in_(user_ids[start:start + batch_size]), lapsed)
+                .values(subscription_tier='free', mrr=0.0).returning(User.id)
+                .execution_options(synchronize_session=False)).scalars())
+
+        totals = {}
+        for user_id in expired:
+            tier, mrr = lapsing[user_id]
+            count, revenue = totals.get(tier, (0, 0.0))
+            totals[tier] = (count + 1, revenue + mrr)
+        connection = db.session.connection()
+        for tier, (count, revenue) in totals.items():
+            SubscriptionMetrics.adjust(connection, tier, -count, -revenue)
+            SubscriptionMetrics.adjust(connection, 'free', count, 0.0)
+        db.session.commit()
+        return len(expired)
+
+class SubscriptionMetrics(db.Model):
+    tier = db.Column(db.String(20), primary_key=True)
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    @staticmethod
+    def adjust(connection, tier, user_delta, revenue_delta):
+        table = SubscriptionMetrics.__table__
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # One atomic upsert: concurrent first adjustments of a new tier cannot
+            # both try to insert its row
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            statement = insert(table).values(tier=tier, user_count=user_delta, revenue=revenue_delta)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.tier],
+                set_={'user_count': table.c.user_count + statement.excluded.user_count,
+                      'revenue': table.c.revenue + statement.excluded.revenue}))
+            return
+        updated = connection.execute(
+            table.update().where(table.c.tier == tier).values(
+                user_count=table.c.user_count + user_delta,
+                revenue=table.c.revenue + revenue_delta))
+        if updated.rowcount == 0:
+            connection.execute(table.insert().values(tier=tier, user_count=user_delta, revenue=revenue_delta))
+
+    @staticmethod
+    def summary(now=None):
+        totals = {row.tier: [row.user_count, row.revenue] for row in SubscriptionMetrics.query}
+        # Subscriptions that have lapsed but not been expired yet count as free,
+        # as they will once expire_lapsed_subscriptions runs
+        lapsed = db.session.query(
+            User.subscription_tier, func.count(User.id), func.sum(func.coalesce(User.mrr, 0.0))
+        ).filter(User.lapsed_subscription(now)).group_by(User.subscription_tier)
+        for tier, count, revenue in lapsed:
+            row = totals.setdefault(tier, [0, 0.0])
+            row[0] -= count
+            row[1] -= revenue or 0.0
+            totals.setdefault('free', [0, 0.0])[0] += count
+        breakdown = [(tier, user_count, revenue) for tier, (user_count, revenue) in sorted(totals.items())]
+        return {
+            'total_mrr': sum(revenue for _, _, revenue in breakdown),
+            'total_users': sum(user_count for _, user_count, _ in breakdown),
+            'paying_users': sum(user_count for tier, user_count, _ in breakdown if tier != 'free'),
+            'breakdown': breakdown,
+        }
+
+    @staticmethod
+    def reconcile():
+        # Recompute from the user table and overwrite the running totals,
+        # returning the tiers whose aggregates had drifted
+        tier = func.coalesce(User.subscription_tier, 'free')
+        actual = {
+            row.tier: (row.user_count, row.revenue or 0.0)
+            for row in db.session.query(
+                tier.label('tier'),
+                func.count(User.id).label('user_count'),
+                func.sum(func.coalesce(User.mrr, 0.0)).label('revenue')
+            ).group_by(tier)
+        }
+        stored = {row.tier: row for row in SubscriptionMetrics.query.with_for_update()}
+        drift = []
+        for tier_name in set(actual) | set(stored):
+            user_count, revenue = actual.get(tier_name, (0, 0.0))
+            row = stored.get(tier_name)
+            if row is None:
+                row = SubscriptionMetrics(tier=tier_name)
+                db.session.add(row)
+            elif row.user_count == user_count and abs(row.revenue - revenue) < 0.005:
+                continue
+            drift.append({
+                'tier': tier_name,
+                'stored_users': row.user_count, 'actual_users': user_count,
+                'stored_revenue': row.revenue, 'actual_revenue': revenue,
+            })
+            row.user_count = user_count
+            row.revenue = revenue
+        db.session.commit()
+        return drift
+
+def _subscription_state(user, committed):
+    # (tier, mrr) before (committed=True) or after the pending change
+    state = inspect(user)
+    values = []
+    for name in ('subscription_tier', 'mrr'):
+        history = state.attrs[name].history
+        if committed and history.has_changes():
+            value = history.deleted[0] if history.deleted else None
+        else:
+            value = getattr(user, name)
+        values.append(value)
+    tier, mrr = values
+    return tier or 'free', mrr or 0.0
+
+@event.listens_for(User, 'after_insert')
+def count_new_user(mapper, connection, user):
+    tier, mrr = _subscription_state(user, committed=False)
+    SubscriptionMetrics.adjust(connection, tier, 1, mrr)
+
+@event.listens_for(User, 'after_update')
+def count_subscription_change(mapper, connection, user):
+    old_tier, old_mrr = _subscription_state(user, committed=True)
+    new_tier, new_mrr = _subscription_state(user, committed=False)
+    if (old_tier, old_mrr) == (new_tier, new_mrr):
+        return
+    SubscriptionMetrics.adjust(connection, old_tier, -1, -old_mrr)
+    SubscriptionMetrics.adjust(connection, new_tier, 1, new_mrr)
+
+@event.listens_for(User, 'after_delete')
+def count_deleted_user(mapper, connection, user):
+    tier, mrr = _subscription_state(user, committed=True)
+    SubscriptionMetrics.adjust(connection, tier, -1, -mrr)
 
 class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -63,7 +251,189 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     description = db.Column(db.String(255))
+    # The payer's subscription tier when the transaction was written
+    tier = db.Column(db.String(20), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_transaction_user_timestamp', 'user_id', 'timestamp'),
+    )
+
+@event.listens_for(Transaction, 'before_insert')
+def record_transaction_tier(mapper, connection, transaction):
+    # Revenue is rolled up under the tier paid on, so a later upgrade or
+    # cancellation does not move it. Core inserts skip this and must set tier.
+    if transaction.tier is None:
+        # A user loaded in this session may have a tier change in the same flush,
+        # not yet written: their in-memory tier is the one being committed
+        key = inspect(User).identity_key_from_primary_key((transaction.user_id,))
+        user = inspect(transaction).session.identity_map.get(key)
+        if user is not None:
+            tier = user.subscription_tier
+        else:
+            tier = connection.scalar(select(User.subscription_tier).where(User.id == transaction.user_id))
+        transaction.tier = tier or 'free'
+
+class RevenueRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.Date, nullable=False)
+    tier = db.Column(db.String(20), nullable=False)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'tier', name='uq_revenue_rollup_bucket'),
+    )
+
+class RollupWatermark(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Product(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float, nullable=False)
+    is_organic = db.Column(db.Boolean, default=False)
+    category = db.Column(db.String(50), nullable=False)
+    tags = db.Column(db.String(255))
+    image_url = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Lets the search index of each process pick up edits made elsewhere
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
+    # Created on first checkout, see payments.ensure_stripe_price
+    stripe_product_id = db.Column(db.String(64))
+    stripe_price_id = db.Column(db.String(64))
+    seller = db.relationship('User', backref=db.backref('products', lazy='dynamic'))
+    tag_entries = db.relationship('ProductTag', backref='product', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_product_lat_lng', 'latitude', 'longitude'),
+        # Keyset pagination orders by (sort column, id) within each filter
+        db.Index('ix_product_category_created', 'category', 'created_at', 'id'),
+        db.Index('ix_product_organic_price', 'is_organic', 'price', 'id'),
+        db.Index('ix_product_created', 'created_at', 'id'),
+        db.Index('ix_product_price', 'price', 'id'),
+    )
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def set_product_geohash(mapper, connection, product):
+    # The geohash is the spatial bucket the map endpoint clusters listings by
+    if product.latitude is None or product.longitude is None:
+        product.geohash = None
+    else:
+        product.geohash = encode_geohash(product.latitude, product.longitude)
+
+@event.listens_for(Product, 'before_update')
+def clear_stale_stripe_price(mapper, connection, product):
+    # Stripe Prices are immutable, so a new price needs a new Price object
+    if inspect(product).attrs.price.history.has_changes():
+        product.stripe_price_id = None
+
+def normalize_tags(tags):
+    normalized = []
+    for tag in (tags or '').split(','):
+        tag = tag.strip().lower()[:50]
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+class ProductTag(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    tag = db.Column(db.String(50), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_product_tag_tag_product', 'tag', 'product_id'),
+    )
+
+@event.listens_for(Product.tags, 'set')
+def sync_product_tags(product, value, oldvalue, initiator):
+    # Keep the indexed tag rows in step with the comma-separated tags column
+    wanted = normalize_tags(value)
+    product.tag_entries = [entry for entry in product.tag_entries if entry.tag in wanted] + [
+        ProductTag(tag=tag) for tag in wanted
+        if tag not in {entry.tag for entry in product.tag_entries}
+    ]
+
+class ForecastResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_forecast_result_product_kind_computed', 'product_id', 'kind', 'computed_at'),
+    )
+
+    @staticmethod
+    def latest(product_id, kind):
+        return ForecastResult.query.filter_by(product_id=product_id, kind=kind) \
+            .order_by(ForecastResult.computed_at.desc()).first()
+
+    @staticmethod
+    def store(product_id, kind, payload):
+        # Every run gets a new row (its id is the API's ETag); the rows it
+        # supersedes are deleted in the same transaction
+        result = ForecastResult(product_id=product_id, kind=kind, payload=json_safe(payload))
+        db.session.add(result)
+        db.session.flush()
+        ForecastResult.query.filter(ForecastResult.product_id == product_id, ForecastResult.kind == kind,
+                                    ForecastResult.id < result.id).delete(synchronize_session=False)
+        return result
+
+def json_safe(value):
+    # NaN and infinity are not JSON (PostgreSQL rejects them), and numpy
+    # scalars are not serialisable: store null and plain Python numbers instead
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if hasattr(value, 'tolist'):
+        # numpy scalar or array
+        return json_safe(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+class UserRecommendation(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    product_ids = db.Column(db.JSON, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+USER_PREFERENCE_FIELDS = ('experience', 'interests', 'garden_size', 'preferred_products', 'organic_preference')
+# Product columns that get_product_recommendations scores on; tags are scored via ProductTag
+PRODUCT_SCORED_FIELDS = ('name', 'is_organic', 'tags')
+
+@event.listens_for(Session, 'after_flush')
+def invalidate_recommendations(session, flush_context):
+    # Any catalog change that can reorder everyone's top products clears them
+    # all; a preference change only affects that user's. Cached entries hold
+    # product ids, so other product edits (price, Stripe ids) show up anyway.
+    catalog_changed = any(
+        isinstance(obj, (Product, ProductTag)) for obj in (*session.new, *session.deleted)
+    ) or any(
+        isinstance(obj, Product) and any(inspect(obj).attrs[field].history.has_changes() for field in PRODUCT_SCORED_FIELDS)
+        for obj in session.dirty
+    )
+    table = UserRecommendation.__table__
+    if catalog_changed:
+        session.connection().execute(table.delete())
+        return
+
+    user_ids = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, User) and any(inspect(obj).attrs[field].history.has_changes() for field in USER_PREFERENCE_FIELDS)
+    ]
+    if user_ids:
+        session.connection().execute(table.delete().where(table.c.user_id.in_(user_ids)))
 
-# Add other models as needed (e.g., Product, Order, etc.)
+# Add other models as needed (e.g., Order, etc.)
@@ -0,0 +1,41 @@
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+# hashlib's scrypt and pbkdf2 release the GIL, so a small pool spreads hashing
+# over the cores while capping how many run at once: a burst of logins queues
+# here instead of starving every other request of CPU.
+_workers = Config.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(_workers + Config.PASSWORD_HASH_QUEUE)
+
+class PasswordHasherBusy(Exception):
+    pass
+
+def _run(function, *args):
+    if not _slots.acquire(timeout=Config.PASSWORD_HASH_QUEUE_TIMEOUT):
+        raise PasswordHasherBusy('Too many password hashes in progress')
+    try:
+        return _executor.submit(function, *args).result()
+    finally:
+        _slots.release()
+
+@functools.lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'), so compare
+    # against what it actually writes for the configured method
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def hash_password(password, method=None):
+    return _run(generate_password_hash, password, method or Config.PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash, method=None):
+    return password_hash.split('$', 1)[0] != _method_prefix(method or Config.PASSWORD_HASH_METHOD)
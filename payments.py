@@ -0,0 +1,71 @@
+import threading
+import uuid
+import requests
+import stripe
+from flask import url_for
+from requests.adapters import HTTPAdapter
+from config import Config
+from models import db
+
+_client = None
+_client_lock = threading.Lock()
+
+def stripe_client():
+    # One client, and one pooled HTTP session, for the whole process: every call
+    # reuses a kept-alive TLS connection instead of opening its own
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.STRIPE_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                base_addresses = {'api': Config.STRIPE_API_BASE} if Config.STRIPE_API_BASE else {}
+                _client = stripe.StripeClient(
+                    Config.STRIPE_SECRET_KEY,
+                    base_addresses=base_addresses,
+                    max_network_retries=Config.STRIPE_MAX_NETWORK_RETRIES,
+                    http_client=stripe.RequestsClient(timeout=Config.STRIPE_TIMEOUT, session=session),
+                )
+    return _client
+
+def unit_amount(product):
+    return int(round(product.price * 100))
+
+def ensure_stripe_price(product):
+    # Stripe Products and Prices are created once and cached on the row; a price
+    # change clears stripe_price_id (see Product's before_update) so a new Price
+    # is made. The idempotency keys make concurrent first checkouts, and retries
+    # after a timeout, get the same objects back instead of duplicates.
+    client = stripe_client()
+    if product.stripe_product_id is None:
+        stripe_product = client.products.create(
+            {'name': product.name, 'metadata': {'product_id': str(product.id)}},
+            {'idempotency_key': f'product-{product.id}'})
+        product.stripe_product_id = stripe_product.id
+    if product.stripe_price_id is None:
+        amount = unit_amount(product)
+        price = client.prices.create(
+            {'product': product.stripe_product_id, 'currency': 'usd', 'unit_amount': amount},
+            {'idempotency_key': f'price-{product.id}-{product.stripe_product_id}-{amount}'})
+        product.stripe_price_id = price.id
+    # Flush only: the caller owns the transaction, and commits the cached ids with its own work
+    db.session.flush()
+    return product.stripe_price_id
+
+def create_checkout_session(product, user=None, idempotency_key=None):
+    params = {
+        'line_items': [{'price': ensure_stripe_price(product), 'quantity': 1}],
+        'mode': 'payment',
+        'success_url': url_for('marketplace', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
+        'cancel_url': url_for('product_detail', product_id=product.id, _external=True),
+        'metadata': {'product_id': str(product.id)},
+    }
+    if user is not None:
+        params['client_reference_id'] = str(user.id)
+        params['customer_email'] = user.email
+    # The same key is sent on every retry of this call, so a retried request
+    # returns the session the first attempt created
+    return stripe_client().checkout.sessions.create(
+        params, {'idempotency_key': idempotency_key or f'checkout-{uuid.uuid4()}'})
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from models import db, Product, User, UserRecommendation
+
+
+def _compute(user):
+    from analytics import get_product_recommendations
+    size = current_app.config['RECOMMENDATION_CACHE_SIZE']
+    return [product.id for product in get_product_recommendations(user, limit=size)]
+
+
+def _store(user_id, product_ids):
+    entry = db.session.get(UserRecommendation, user_id)
+    if entry is None:
+        entry = UserRecommendation(user_id=user_id)
+        db.session.add(entry)
+    entry.product_ids = product_ids
+    entry.computed_at = datetime.utcnow()
+
+
+def get_cached_recommendations(user, limit=5):
+    if limit > current_app.config['RECOMMENDATION_CACHE_SIZE']:
+        from analytics import get_product_recommendations
+        return get_product_recommendations(user, limit=limit)
+
+    ttl = timedelta(seconds=current_app.config['RECOMMENDATION_CACHE_TTL'])
+    entry = db.session.get(UserRecommendation, user.id)
+    if entry is not None and entry.computed_at > datetime.utcnow() - ttl:
+        product_ids = entry.product_ids[:limit]
+    else:
+        product_ids = _compute(user)
+        _store(user.id, product_ids)
+        db.session.commit()
+        product_ids = product_ids[:limit]
+
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids))}
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def prune_recommendations():
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['RECOMMENDATION_CACHE_TTL'])
+    deleted = UserRecommendation.query.filter(UserRecommendation.computed_at < cutoff).delete()
+    db.session.commit()
+    return deleted
+
+
+def recompute_all_recommendations(batch_size=500):
+    recomputed = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            _store(user.id, _compute(user))
+        db.session.commit()
+        recomputed += len(users)
+        last_id = users[-1].id
+    return recomputed
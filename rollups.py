@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from models import db, Transaction, RevenueRollup, RollupWatermark
+
+GRANULARITIES = ('day', 'week', 'month')
+WATERMARK = 'revenue_rollup'
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _apply(totals):
+    for granularity in GRANULARITIES:
+        keys = [key for key in totals if key[0] == granularity]
+        if not keys:
+            continue
+        existing = {
+            (row.granularity, row.bucket_start, row.tier): row
+            for row in RevenueRollup.query.filter(
+                RevenueRollup.granularity == granularity,
+                RevenueRollup.bucket_start.in_({key[1] for key in keys}))
+        }
+        for key in keys:
+            revenue, count = totals[key]
+            row = existing.get(key)
+            if row is None:
+                db.session.add(RevenueRollup(granularity=key[0], bucket_start=key[1], tier=key[2],
+                                             revenue=revenue, transaction_count=count))
+            else:
+                row.revenue += revenue
+                row.transaction_count += count
+
+
+def update_revenue_rollups(batch_size=10000):
+    # Folds transactions newer than the watermark into the rollups. Each batch
+    # commits together with the advanced watermark, so a crash never counts a
+    # transaction twice.
+    processed = 0
+    while True:
+        watermark = RollupWatermark.query.filter_by(name=WATERMARK).with_for_update().first()
+        if watermark is None:
+            watermark = RollupWatermark(name=WATERMARK, last_id=0)
+            db.session.add(watermark)
+
+        # Bucketed by the tier stored on each transaction, not the payer's current one
+        rows = db.session.query(
+            Transaction.id, Transaction.amount, Transaction.timestamp, Transaction.tier
+        ).filter(Transaction.id > watermark.last_id) \
+            .order_by(Transaction.id).limit(batch_size).all()
+        if not rows:
+            db.session.rollback()
+            break
+
+        totals = defaultdict(lambda: [0.0, 0])
+        for row in rows:
+            if row.timestamp is None:
+                continue
+            for granularity in GRANULARITIES:
+                key = (granularity, bucket_start(row.timestamp.date(), granularity), row.tier)
+                totals[key][0] += row.amount
+                totals[key][1] += 1
+        _apply(totals)
+        watermark.last_id = rows[-1].id
+        db.session.commit()
+        processed += len(rows)
+    return processed
+
+
+def revenue_series(granularity, start, end, tier=None):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    first = bucket_start(start, granularity)
+    query = RevenueRollup.query.filter(
+        RevenueRollup.granularity == granularity,
+        RevenueRollup.bucket_start >= first,
+        RevenueRollup.bucket_start <= end)
+    if tier:
+        query = query.filter(RevenueRollup.tier == tier)
+
+    labels = []
+    day = first
+    while day <= end:
+        labels.append(day)
+        day = next_bucket(day, granularity)
+    positions = {day: i for i, day in enumerate(labels)}
+
+    series = defaultdict(lambda: [0.0] * len(labels))
+    for row in query:
+        series[row.tier][positions[row.bucket_start]] += row.revenue
+    return {
+        'granularity': granularity,
+        'labels': [day.isoformat() for day in labels],
+        'series': dict(series),
+    }
+
+
+def revenue_by_tier():
+    return db.session.query(
+        RevenueRollup.tier, db.func.sum(RevenueRollup.revenue)
+    ).filter(RevenueRollup.granularity == 'month') \
+        .group_by(RevenueRollup.tier).order_by(RevenueRollup.tier).all()
@@ -0,0 +1,283 @@
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, load_only
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+FIELD_WEIGHTS = {'name': 3.0, 'tags': 2.0, 'category': 1.5, 'description': 1.0}
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Query terms are expanded to at most this many indexed terms when prefix matching
+MAX_PREFIX_EXPANSION = 50
+# How often a process checks the database for products changed by other workers
+REFRESH_INTERVAL = 30
+# Refreshes look back this far before the last one, for transactions that
+# committed late and for clock differences between hosts
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # term -> {product_id: weighted term frequency}
+        self._terms = []  # sorted vocabulary, for prefix lookups
+        self._lengths = {}  # product_id -> weighted document length
+        self._document_terms = {}
+        self._names = {}
+        self._total_length = 0.0
+        # term -> {product_id: BM25 score}; any change to the index invalidates it
+        self._score_cache = {}
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def product_ids(self):
+        with self._lock:
+            return set(self._lengths)
+
+    def add(self, product_id, name='', description='', tags='', category=''):
+        fields = {'name': name, 'description': description, 'tags': tags, 'category': category}
+        frequencies = Counter()
+        for field, text in fields.items():
+            for token in tokenize(text):
+                frequencies[token] += FIELD_WEIGHTS[field]
+        with self._lock:
+            self.remove(product_id)
+            self._score_cache.clear()
+            for term, frequency in frequencies.items():
+                if term not in self._postings:
+                    bisect.insort(self._terms, term)
+                self._postings[term][product_id] = frequency
+            length = sum(frequencies.values())
+            self._document_terms[product_id] = list(frequencies)
+            self._lengths[product_id] = length
+            self._names[product_id] = name
+            self._total_length += length
+
+    def add_product(self, product):
+        self.add(product.id, product.name, product.description, product.tags, product.category)
+
+    def add_fields(self, fields):
+        self.add(fields['id'], fields['name'], fields['description'], fields['tags'], fields['category'])
+
+    def remove(self, product_id):
+        with self._lock:
+            length = self._lengths.pop(product_id, None)
+            if length is None:
+                return
+            self._score_cache.clear()
+            self._names.pop(product_id, None)
+            self._total_length -= length
+            for term in self._document_terms.pop(product_id):
+                postings = self._postings[term]
+                del postings[product_id]
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        stop = bisect.bisect_left(self._terms, prefix + '\uffff', lo=start)
+        return self._terms[start:min(stop, start + MAX_PREFIX_EXPANSION)]
+
+    def _term_scores(self, term):
+        scores = self._score_cache.get(term)
+        if scores is None:
+            postings = self._postings.get(term, {})
+            documents = len(self._lengths)
+            average_length = self._total_length / documents
+            idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+            lengths = self._lengths
+            scores = {
+                product_id: idf * frequency * (K1 + 1)
+                / (frequency + K1 * (1 - B + B * lengths[product_id] / average_length))
+                for product_id, frequency in postings.items()
+            }
+            self._score_cache[term] = scores
+        return scores
+
+    def _prefix_scores(self, prefix, terms):
+        # A product matching several completions counts its best one
+        key = prefix + '*'
+        scores = self._score_cache.get(key)
+        if scores is None:
+            scores = {}
+            for term in terms:
+                for product_id, score in self._term_scores(term).items():
+                    if score > scores.get(product_id, 0):
+                        scores[product_id] = score
+            self._score_cache[key] = scores
+        return scores
+
+    def search(self, query, limit=20, prefix=True):
+        # BM25 over the weighted fields. Every query term must match (AND); the
+        # last one also matches as a prefix so partially typed words complete.
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            if not self._lengths:
+                return []
+            per_token = []
+            for position, token in enumerate(tokens):
+                terms = self._expand(token) if prefix and position == len(tokens) - 1 else [token]
+                if len(terms) == 1:
+                    token_scores = self._term_scores(terms[0])
+                else:
+                    token_scores = self._prefix_scores(token, terms)
+                if not token_scores:
+                    return []
+                per_token.append(token_scores)
+
+            per_token.sort(key=len)
+            scores = per_token[0]
+            for token_scores in per_token[1:]:
+                scores = {product_id: score + token_scores[product_id]
+                          for product_id, score in scores.items() if product_id in token_scores}
+            return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def suggest(self, query, limit=10):
+        return [self._names[product_id] for product_id, _ in self.search(query, limit=limit)]
+
+
+class SearchIndexWarming(Exception):
+    pass
+
+
+class CatalogSearch:
+    # The index of the current process. It is built in a background thread at
+    # start-up and kept current by the session hooks below; every
+    # REFRESH_INTERVAL seconds it also reindexes products edited by other
+    # processes (by updated_at) and drops ones they deleted.
+    def __init__(self):
+        self.index = None
+        self._lock = threading.Lock()
+        self._builder = None
+        self._watermark = None
+        self._checked_at = 0.0
+
+    def start(self, app):
+        with self._lock:
+            # is_alive: a builder thread does not survive a fork into a worker process
+            if self.index is None and (self._builder is None or not self._builder.is_alive()):
+                self._builder = threading.Thread(target=self._build, args=(app,), name='search-index', daemon=True)
+                self._builder.start()
+
+    def _build(self, app):
+        index = ProductSearchIndex()
+        # Changes committed while the build runs are caught by the first refresh
+        started = datetime.utcnow()
+        try:
+            with app.app_context():
+                for product in _indexed(Product.query):
+                    index.add_product(product)
+        except Exception:
+            logger.exception('Building the search index failed')
+            with self._lock:
+                self._builder = None
+            return
+        with self._lock:
+            self.index = index
+            self._watermark = started - REFRESH_OVERLAP
+            self._checked_at = time.monotonic()
+            self._builder = None
+        logger.info('Search index built: %d products', len(index))
+
+    def _refresh(self):
+        started = datetime.utcnow()
+        for product in _indexed(Product.query.filter(Product.updated_at >= self._watermark)):
+            self.index.add_product(product)
+        self._watermark = started - REFRESH_OVERLAP
+        # After the edits above the index holds the same rows as the table
+        # unless some were deleted (or slipped past the watermark): reconcile ids
+        if len(self.index) != Product.query.count():
+            current = {product_id for (product_id,) in Product.query.with_entities(Product.id)}
+            indexed = self.index.product_ids()
+            for product_id in indexed - current:
+                self.index.remove(product_id)
+            missing = current - indexed
+            if missing:
+                for product in _indexed(Product.query.filter(Product.id.in_(missing))):
+                    self.index.add_product(product)
+
+    def ensure_current(self):
+        if self.index is None:
+            self.start(current_app._get_current_object())
+            raise SearchIndexWarming('The search index is still being built')
+        if time.monotonic() - self._checked_at > REFRESH_INTERVAL and self._lock.acquire(blocking=False):
+            # One request refreshes; the others keep searching the current index meanwhile
+            try:
+                self._checked_at = time.monotonic()
+                self._refresh()
+            finally:
+                self._lock.release()
+        return self.index
+
+    def search(self, query, limit=20):
+        return self.ensure_current().search(query, limit=limit)
+
+    def suggest(self, query, limit=10):
+        return self.ensure_current().suggest(query, limit=limit)
+
+    def apply(self, added, removed):
+        if self.index is None:
+            return
+        for fields in added:
+            self.index.add_fields(fields)
+        for product_id in removed:
+            self.index.remove(product_id)
+
+
+def _indexed(query):
+    return query.options(load_only(Product.id, Product.name, Product.description,
+                                   Product.tags, Product.category)).yield_per(1000)
+
+
+catalog_search = CatalogSearch()
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_product_changes(session, flush_context):
+    changed = session.info.setdefault('search_changed', {})
+    removed = session.info.setdefault('search_removed', set())
+    # Copy the indexed fields now: after the commit the instances are expired
+    # and the session can no longer load them
+    for product in list(session.new) + list(session.dirty):
+        if isinstance(product, Product):
+            changed[product.id] = {field: getattr(product, field)
+                                   for field in ('id', 'name', 'description', 'tags', 'category')}
+    for product in session.deleted:
+        if isinstance(product, Product):
+            changed.pop(product.id, None)
+            removed.add(product.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def update_search_index(session):
+    changed = session.info.pop('search_changed', {})
+    removed = session.info.pop('search_removed', set())
+    if changed or removed:
+        catalog_search.apply(changed.values(), removed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_product_changes(session):
+    session.info.pop('search_changed', None)
+    session.info.pop('search_removed', None)
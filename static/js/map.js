@@ -1,6 +1,12 @@
 let map;
 let heatmap;
 let climateHeatmap;
+let infoWindow;
+let markers = [];
+let produceRequest;
+
+// Listings fetched per viewport when zoomed in, across pages of the endpoint
+const MAX_POINTS_PER_VIEW = 2000;
 
 function initMap() {
     console.log('Initializing map...');
@@ -8,26 +14,82 @@ function initMap() {
         center: { lat: 40.7128, lng: -74.0060 }, // New York City
         zoom: 13,
     });
+    infoWindow = new google.maps.InfoWindow();
+    heatmap = new google.maps.visualization.HeatmapLayer({ data: [], map: map });
     console.log('Map initialized');
 
-    // Fetch produce data from the server
-    console.log('Fetching produce data...');
-    fetch('/api/produce_data')
-        .then(response => response.json())
+    // Only load what is in view, once panning or zooming has settled
+    map.addListener('idle', loadProduceData);
+
+    // Add climate and planting zones heat map
+    addClimateHeatMap();
+}
+
+function loadProduceData() {
+    if (produceRequest) {
+        produceRequest.abort();
+    }
+    produceRequest = new AbortController();
+    const params = new URLSearchParams({
+        bbox: map.getBounds().toUrlValue(),
+        zoom: map.getZoom(),
+    });
+    fetchProducePages(params, [], produceRequest.signal)
         .then(data => {
-            console.log('Produce data received:', data);
-            addMarkers(data);
+            clearMarkers();
+            if (data.mode === 'clusters') {
+                addClusters(data.clusters);
+            } else {
+                addMarkers(data.points);
+            }
             addProduceHeatMap(data);
-            console.log('Produce heatmap initialized:', heatmap);
         })
-        .catch(error => console.error('Error fetching produce data:', error));
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching produce data:', error);
+            }
+        });
+}
 
-    // Add climate and planting zones heat map
-    addClimateHeatMap();
+function fetchProducePages(params, points, signal) {
+    return fetch(`/api/produce_data?${params}`, { signal })
+        .then(response => response.json())
+        .then(data => {
+            if (data.mode === 'clusters') {
+                return data;
+            }
+            points = points.concat(data.points);
+            if (data.next !== null && points.length < MAX_POINTS_PER_VIEW) {
+                params.set('after', data.next);
+                return fetchProducePages(params, points, signal);
+            }
+            return { mode: 'points', points: points };
+        });
+}
+
+function clearMarkers() {
+    markers.forEach(marker => marker.setMap(null));
+    markers = [];
+}
+
+function addClusters(clusters) {
+    clusters.forEach(cluster => {
+        const marker = new google.maps.Marker({
+            position: { lat: cluster.lat, lng: cluster.lng },
+            map: map,
+            label: String(cluster.count),
+            title: `${cluster.count} listings`,
+        });
+        // Zoom into the cluster to see its listings
+        marker.addListener('click', () => {
+            map.setCenter(marker.getPosition());
+            map.setZoom(map.getZoom() + 2);
+        });
+        markers.push(marker);
+    });
 }
 
 function addMarkers(locations) {
-    console.log('Adding markers...');
     locations.forEach(location => {
         const marker = new google.maps.Marker({
             position: { lat: location.lat, lng: location.lng },
@@ -35,33 +97,30 @@ function addMarkers(locations) {
             title: location.name,
         });
 
-        const infoWindow = new google.maps.InfoWindow({
-            content: `
+        marker.addListener('click', () => {
+            infoWindow.setContent(`
                 <h3>${location.name}</h3>
                 <p>Price: $${location.price}</p>
                 <p>Organic: ${location.organic ? 'Yes' : 'No'}</p>
-            `
-        });
-
-        marker.addListener('click', () => {
+            `);
             infoWindow.open(map, marker);
         });
+        markers.push(marker);
     });
-    console.log('Markers added');
 }
 
-function addProduceHeatMap(locations) {
-    console.log('Adding produce heatmap...');
-    const heatmapData = locations.map(location => ({
-        location: new google.maps.LatLng(location.lat, location.lng),
-        weight: location.organic ? 0.8 : 0.5, // Higher weight for organic produce
-    }));
-
-    heatmap = new google.maps.visualization.HeatmapLayer({
-        data: heatmapData,
-        map: map,
-    });
-    console.log('Produce heatmap added');
+function addProduceHeatMap(data) {
+    // Higher weight for organic produce; clusters weigh as much as their listings
+    const heatmapData = data.mode === 'clusters'
+        ? data.clusters.map(cluster => ({
+            location: new google.maps.LatLng(cluster.lat, cluster.lng),
+            weight: cluster.count * (0.5 + 0.3 * cluster.organic_share),
+        }))
+        : data.points.map(location => ({
+            location: new google.maps.LatLng(location.lat, location.lng),
+            weight: location.organic ? 0.8 : 0.5,
+        }));
+    heatmap.setData(heatmapData);
 }
 
 function toggleProduceHeatmap() {
@@ -107,46 +166,42 @@ function changeGradient() {
 }
 
 function addClimateHeatMap() {
-    console.log('Adding climate zone heatmap...');
+    // Pre-rendered zone tiles under the raster's version, so the browser keeps
+    // them until a rebuild changes it; not shown until toggled on
+    console.log('Adding climate zone layer...');
     fetch('/api/climate_zones')
         .then(response => response.json())
-        .then(data => {
-            console.log('Climate zone data received:', data);
-            const climateHeatmapData = data.map(zone => ({
-                location: new google.maps.LatLng(zone.lat, zone.lng),
-                weight: zone.weight
-            }));
-
-            climateHeatmap = new google.maps.visualization.HeatmapLayer({
-                data: climateHeatmapData,
-                map: null, // Initially not displayed
-                gradient: getClimateGradient()
+        .then(layer => {
+            const version = encodeURIComponent(layer.version);
+            climateHeatmap = new google.maps.ImageMapType({
+                getTileUrl: (coord, zoom) => {
+                    const tiles = 1 << zoom;
+                    const x = ((coord.x % tiles) + tiles) % tiles;
+                    if (coord.y < 0 || coord.y >= tiles || zoom > layer.max_zoom) {
+                        return null;
+                    }
+                    return `/api/climate_zones/${zoom}/${x}/${coord.y}.png?v=${version}`;
+                },
+                tileSize: new google.maps.Size(256, 256),
+                maxZoom: layer.max_zoom,
+                name: 'Climate zones',
             });
-            console.log('Climate zone heatmap initialized:', climateHeatmap);
         })
-        .catch(error => console.error('Error fetching climate zone data:', error));
-}
-
-function getClimateGradient() {
-    return [
-        'rgba(0, 255, 0, 0)',   // Transparent green
-        'rgba(0, 255, 0, 1)',   // Solid green
-        'rgba(255, 255, 0, 1)', // Yellow
-        'rgba(255, 128, 0, 1)', // Orange
-        'rgba(255, 0, 0, 1)'    // Red
-    ];
+        .catch(error => console.error('Error loading climate zone layer:', error));
 }
 
 function toggleClimateHeatmap() {
-    console.log('Toggling climate zone heatmap...');
+    console.log('Toggling climate zone layer...');
     if (climateHeatmap) {
-        console.log('Climate heatmap exists');
-        const currentMap = climateHeatmap.getMap();
-        console.log('Current map:', currentMap ? 'visible' : 'hidden');
-        climateHeatmap.setMap(currentMap ? null : map);
-        console.log('Climate heatmap visibility toggled:', currentMap ? 'hidden' : 'visible');
+        const index = map.overlayMapTypes.getArray().indexOf(climateHeatmap);
+        if (index === -1) {
+            map.overlayMapTypes.push(climateHeatmap);
+        } else {
+            map.overlayMapTypes.removeAt(index);
+        }
+        console.log('Climate zone layer toggled:', index === -1 ? 'visible' : 'hidden');
     } else {
-        console.error('Climate heatmap not initialized');
+        console.error('Climate zone layer not initialized');
     }
 }
 
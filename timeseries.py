@@ -0,0 +1,122 @@
+import csv
+import fcntl
+import os
+import threading
+from collections import defaultdict
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+COLUMNS = ('demand', 'supply', 'price', 'weather')
+DATES_FILE = 'date.i8'
+
+
+# Daily observations per product, one raw little-endian file per column:
+# date.i8 (days since the epoch) plus <column>.f8. Appends only add rows after
+# the last stored date, and reads are zero-copy windows over memory maps.
+class TimeSeriesStore:
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _product_dir(self, product):
+        return os.path.join(self.root, quote(product, safe=''))
+
+    def _column_path(self, product, column):
+        return os.path.join(self._product_dir(product), f'{column}.f8')
+
+    def products(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.root))
+
+    def __len__(self):
+        return len(self.products())
+
+    def length(self, product):
+        try:
+            return os.path.getsize(os.path.join(self._product_dir(product), DATES_FILE)) // 8
+        except FileNotFoundError:
+            return 0
+
+    def append(self, product, dates, **columns):
+        missing = set(COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f'Missing columns: {", ".join(sorted(missing))}')
+        days = np.asarray(dates, dtype='datetime64[D]').astype('<i8')
+        values = {column: np.asarray(columns[column], dtype='<f8') for column in COLUMNS}
+        if any(len(array) != len(days) for array in values.values()):
+            raise ValueError('All columns must have one value per date')
+
+        # Keep the last observation for each date, in date order
+        order = np.argsort(days, kind='stable')[::-1]
+        days_sorted, first = np.unique(days[order], return_index=True)
+        keep = order[first]
+
+        directory = self._product_dir(product)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            stored_dates, _ = self.read(product, days=1)
+            if len(stored_dates):
+                newer = days_sorted > stored_dates[-1].astype('<i8')
+                days_sorted, keep = days_sorted[newer], keep[newer]
+            if len(days_sorted) == 0:
+                return 0
+            committed = self.length(product) * 8
+            for column in COLUMNS:
+                self._write_at(self._column_path(product, column), committed, values[column][keep].tobytes())
+            # The date file is written last: its length is the committed row count
+            self._write_at(os.path.join(directory, DATES_FILE), committed, days_sorted.tobytes())
+        return len(days_sorted)
+
+    @staticmethod
+    def _write_at(path, offset, data):
+        # Cut off anything past the committed rows first: an append that died
+        # before writing the date file leaves a tail that would misalign the columns
+        with open(path, 'ab') as f:
+            f.truncate(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _mapped(self, product):
+        rows = self.length(product)
+        with self._lock:
+            cached = self._maps.get(product)
+            if cached is not None and cached[0] == rows:
+                return cached[1]
+            if rows == 0:
+                arrays = None
+            else:
+                directory = self._product_dir(product)
+                arrays = {'date': np.memmap(os.path.join(directory, DATES_FILE), dtype='<i8', mode='r', shape=(rows,))}
+                for column in COLUMNS:
+                    arrays[column] = np.memmap(self._column_path(product, column), dtype='<f8', mode='r', shape=(rows,))
+            self._maps[product] = (rows, arrays)
+            return arrays
+
+    def read(self, product, days=None):
+        arrays = self._mapped(product)
+        if arrays is None:
+            return np.empty(0, dtype='datetime64[D]'), {column: np.empty(0) for column in COLUMNS}
+        window = slice(-days, None) if days else slice(None)
+        dates = arrays['date'][window].view('datetime64[D]')
+        return dates, {column: arrays[column][window] for column in COLUMNS}
+
+
+def ingest_csv(store, path):
+    # CSV columns: product, date (YYYY-MM-DD), demand, supply, price, weather
+    rows = defaultdict(lambda: defaultdict(list))
+    with open(path, newline='') as f:
+        for record in csv.DictReader(f):
+            product_rows = rows[record['product']]
+            product_rows['date'].append(record['date'])
+            for column in COLUMNS:
+                product_rows[column].append(float(record[column]))
+    appended = {}
+    for product, columns in rows.items():
+        dates = columns.pop('date')
+        appended[product] = store.append(product, dates, **columns)
+    return appended
@@ -0,0 +1,39 @@
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from cache import TTLCache
+from config import Config
+from models import db, User
+
+# What auth and the navigation need; anything else lazy-loads when first used.
+# Subscription state is deliberately left out: it changes behind the cache
+# (expire_lapsed_subscriptions), and the SubscriptionMetrics listeners take
+# the old tier from the instance, so it must come from the database.
+IDENTITY_COLUMNS = ('id', 'username', 'email', 'user_type')
+
+identity_cache = TTLCache(max_entries=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+def load_cached_user(user_id):
+    values = identity_cache.get(user_id)
+    if values is None:
+        row = db.session.query(*(getattr(User, column) for column in IDENTITY_COLUMNS)) \
+            .filter(User.id == user_id).first()
+        if row is None:
+            return None
+        values = row._asdict()
+        identity_cache.set(user_id, values)
+    # Rebuild the instance as if just loaded and attach it without a query
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_user(user_id):
+    identity_cache.pop(user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, user):
+    # Profile edits and deletions go through the mapper. The cache is per
+    # process, though: other workers keep their copy until USER_CACHE_TTL
+    # expires, so that TTL bounds how long a changed username, email or
+    # user_type can be served stale elsewhere.
+    invalidate_user(user.id)